@@ -0,0 +1,118 @@
+"""
+Throughput of the old thread-per-request data layer vs. the asyncio one, against a
+local stand-in backend (no Supabase needed).
+
+Each simulated request runs `--queries` sequential queries of `--latency` seconds;
+`--fail-rate` of the queries fail once and go through the retry path.
+
+    python -m benchmarks.bench_db_concurrency --requests 2000 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from repositories import supabase_repo
+
+
+class StandInQuery:
+    """Blocking stand-in for a PostgREST query builder."""
+
+    def __init__(self, latency: float, fail: bool):
+        self.latency = latency
+        self.fail = fail
+
+    def execute(self):
+        time.sleep(self.latency)
+        if self.fail:
+            self.fail = False
+            raise ConnectionError("stand-in transient failure")
+        return {"data": []}
+
+
+class AsyncStandInQuery(StandInQuery):
+    """Non-blocking stand-in, like the builders of supabase's AsyncClient."""
+
+    async def execute(self):
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            self.fail = False
+            raise ConnectionError("stand-in transient failure")
+        return {"data": []}
+
+
+def legacy_execute_safe(query_builder, retries: int = 3, delay: int = 1):
+    # The previous synchronous wrapper: fixed time.sleep between attempts
+    last_exception = None
+    for i in range(retries):
+        try:
+            return query_builder.execute()
+        except Exception as e:
+            last_exception = e
+            time.sleep(delay)
+    raise last_exception
+
+
+def run_sync(args, failures):
+    def handle(i):
+        for q in range(args.queries):
+            legacy_execute_safe(StandInQuery(args.latency, failures[i][q]), delay=args.legacy_delay)
+
+    start = time.perf_counter()
+    # Starlette runs sync endpoints on a 40-thread pool by default
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(handle, range(args.requests)))
+    return time.perf_counter() - start
+
+
+async def run_async(args, failures):
+    supabase_repo.set_max_concurrency(args.concurrency)
+
+    async def handle(i):
+        for q in range(args.queries):
+            await supabase_repo.execute_safe(AsyncStandInQuery(args.latency, failures[i][q]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handle(i) for i in range(args.requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=3, help="sequential queries per request")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stand-in query")
+    parser.add_argument("--fail-rate", type=float, default=0.02)
+    parser.add_argument("--threads", type=int, default=40, help="threadpool size for the sync path")
+    parser.add_argument("--concurrency", type=int, default=supabase_repo.DB_MAX_CONCURRENCY,
+                        help="DB_MAX_CONCURRENCY for the async path")
+    parser.add_argument("--legacy-delay", type=float, default=1.0, help="old fixed retry sleep")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    failures = [[rng.random() < args.fail_rate for _ in range(args.queries)] for _ in range(args.requests)]
+
+    sync_s = run_sync(args, failures)
+    async_s = asyncio.run(run_async(args, failures))
+
+    results = {
+        "requests": args.requests,
+        "queries_per_request": args.queries,
+        "latency_s": args.latency,
+        "sync_threadpool": {"seconds": round(sync_s, 3), "req_per_s": round(args.requests / sync_s, 1)},
+        "asyncio": {"seconds": round(async_s, 3), "req_per_s": round(args.requests / async_s, 1)},
+        "speedup": round(sync_s / async_s, 2),
+    }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"sync ({args.threads} threads):   {results['sync_threadpool']['req_per_s']:>8} req/s")
+        print(f"asyncio (limit {args.concurrency}): {results['asyncio']['req_per_s']:>8} req/s")
+        print(f"speedup: {results['speedup']}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Cold-start breakdown of one API worker: import time per module (`python -X importtime`
+of `import main` in a fresh interpreter) and the lifespan startup steps (database
+client, warm-up, ingest replay) against a temporary SQLite datastore.
+
+Modules are grouped by top-level package (`google`, `supabase`, `routers`, ...) with
+their cumulative time; `--modules` also lists the slowest individual modules.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --modules 15 --json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter: imports main, enters the lifespan, prints the timings as JSON
+_CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+import_s = time.perf_counter() - started
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+started = time.perf_counter()
+asyncio.run(boot())
+print("@@" + json.dumps({"import": import_s, "lifespan": time.perf_counter() - started,
+                         "steps": main.startup_timings,
+                         "genai_loaded": "google.generativeai" in __import__("sys").modules,
+                         "numpy_loaded": "numpy" in __import__("sys").modules}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """
+    Returns [(module, self_us, cumulative_us, depth)] from `-X importtime` output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def run_once(workdir: str) -> dict:
+    env = dict(os.environ, DB_BACKEND="sqlite", SQLITE_PATH=os.path.join(workdir, "startup.db"),
+               INGEST_JOURNAL_DIR=os.path.join(workdir, "journal"))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+    result = json.loads(next(line[2:] for line in proc.stdout.splitlines() if line.startswith("@@")))
+    result["modules"] = parse_importtime(proc.stderr)
+    return result
+
+
+def summarize(runs, top_modules: int) -> dict:
+    packages = defaultdict(list)
+    slowest = defaultdict(list)
+    for run in runs:
+        per_package = defaultdict(int)
+        for name, self_us, cumulative_us, depth in run["modules"]:
+            # Self time summed per top-level package equals the cumulative time of its subtree
+            per_package[name.split(".")[0]] += self_us
+            slowest[name].append(cumulative_us)
+        for package, us in per_package.items():
+            packages[package].append(us)
+
+    def ms(values):
+        return round(min(values) / 1000, 1)  # best run; less noise from the page cache
+
+    steps = defaultdict(list)
+    for run in runs:
+        for name, seconds in run["steps"].items():
+            steps[name].append(seconds * 1e6)
+
+    return {
+        "runs": len(runs),
+        "import_ms": ms([r["import"] * 1e6 for r in runs]),
+        "lifespan_ms": ms([r["lifespan"] * 1e6 for r in runs]),
+        "steps_ms": {name: ms(values) for name, values in steps.items()},
+        "lazy": {"google.generativeai": not runs[-1]["genai_loaded"], "numpy": not runs[-1]["numpy_loaded"]},
+        "packages_ms": dict(sorted(((p, ms(v)) for p, v in packages.items()), key=lambda kv: -kv[1])),
+        "slowest_modules_ms": dict(sorted(((m, ms(v)) for m, v in slowest.items()),
+                                          key=lambda kv: -kv[1])[:top_modules])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to start (best run is reported)")
+    parser.add_argument("--packages", type=int, default=15, help="top-level packages to list")
+    parser.add_argument("--modules", type=int, default=0, help="also list the N slowest modules")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="startup-")
+    report = summarize([run_once(workdir) for _ in range(args.runs)], args.modules)
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"import main: {report['import_ms']} ms   lifespan startup: {report['lifespan_ms']} ms "
+          f"(best of {report['runs']})")
+    for name, value in report["steps_ms"].items():
+        print(f"  {name:<28} {value:>8} ms")
+    print("not loaded at boot: " + ", ".join(m for m, lazy in report["lazy"].items() if lazy))
+    print(f"\n{'package':<30} {'import ms':>10}")
+    for name, value in list(report["packages_ms"].items())[:args.packages]:
+        print(f"{name:<30} {value:>10}")
+    if args.modules:
+        print(f"\n{'module (cumulative)':<50} {'ms':>8}")
+        for name, value in report["slowest_modules_ms"].items():
+            print(f"{name:<50} {value:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Per-row timestamp aggregation (the old dashboard loop: `datetime.fromisoformat` +
+dict increments) vs. the NumPy bucketing in services/time_buckets.
+
+Both compute the month chart, the current-month total and the previous-month total
+from the same synthetic ISO timestamps.
+
+    python -m benchmarks.bench_time_buckets --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from services import time_buckets
+
+CHART_START = date(2024, 5, 1)
+CHART_END = date(2024, 5, 31)
+PREV_START = date(2024, 4, 1)
+PREV_END = date(2024, 4, 30)
+
+
+def make_timestamps(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    base = datetime(2024, 3, 15)
+    span = 90 * 86400
+    return [(base + timedelta(seconds=rng.randrange(span), microseconds=rng.randrange(10 ** 6)))
+            .isoformat() + "+00:00" for _ in range(n)]
+
+
+def legacy_loop(timestamps):
+    current_count = 0
+    prev_count = 0
+    chart_map = {}
+    for ts in timestamps:
+        d = datetime.fromisoformat(ts).date()
+        if CHART_START <= d <= CHART_END:
+            current_count += 1
+            key = str(d.day)
+            chart_map[key] = chart_map.get(key, 0) + 1
+        elif PREV_START <= d <= PREV_END:
+            prev_count += 1
+    chart = [chart_map.get(str(day), 0) for day in range(1, 32)]
+    return chart, current_count, prev_count
+
+
+def vectorized(timestamps):
+    stamps = time_buckets.to_datetime64(timestamps)
+    h = time_buckets.period_histogram(stamps, 'month', (CHART_START, CHART_END, PREV_START, PREV_END))
+    return h.chart.tolist(), h.current_count, h.prev_count
+
+
+def best_of(func, arg, repeat: int):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs per size")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        timestamps = make_timestamps(n)
+        loop_s, expected = best_of(legacy_loop, timestamps, args.repeat)
+        numpy_s, actual = best_of(vectorized, timestamps, args.repeat)
+        if expected != actual:
+            raise SystemExit(f"Mismatch at {n} rows: {expected} != {actual}")
+        results.append({
+            "rows": n,
+            "loop_ms": round(loop_s * 1000, 2),
+            "numpy_ms": round(numpy_s * 1000, 2),
+            "speedup": round(loop_s / numpy_s, 2)
+        })
+
+    if args.json:
+        print(json.dumps({"numpy": np.__version__, "results": results}))
+    else:
+        print(f"{'rows':>10} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}")
+        for r in results:
+            print(f"{r['rows']:>10} {r['loop_ms']:>10} {r['numpy_ms']:>10} {r['speedup']:>7}x")
+
+
+if __name__ == "__main__":
+    main()
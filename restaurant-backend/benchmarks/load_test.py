@@ -0,0 +1,227 @@
+"""
+Load test of the hot API endpoints against a seeded local SQLite datastore
+(DB_BACKEND=sqlite, no Supabase needed).
+
+Seeds owners, their stores, surveys (with lotteries) and backdated responses, rebuilds
+the daily rollup, then drives the app in-process (httpx ASGI transport, lifespan
+included) with a fixed number of concurrent clients per run. Reports throughput and
+p50/p95/p99 latency per endpoint and concurrency level.
+
+    python -m benchmarks.load_test --owners 5 --stores 4 --responses 100000 --concurrency 1 10 50
+    python -m benchmarks.load_test --json --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ENDPOINTS = ("submit_response", "dashboard_stats", "trends", "dashboard", "get_surveys", "get_lotteries")
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+async def seed(args, rng: random.Random) -> dict:
+    """
+    Fills the datastore and returns the ids the request generators pick from.
+    """
+    import database
+    from services import rollup_service
+
+    repo = database.repo
+    owners, stores, surveys = [], [], []
+    now = datetime.now()
+
+    for o in range(args.owners):
+        owner_id = str(uuid.uuid4())
+        await repo.insert_merchant({"id": owner_id, "restaurant_name": f"Owner {o}", "username": f"owner{o}",
+                                    "password": "pw", "role": "owner", "owner_id": None})
+        owners.append(owner_id)
+
+        for s in range(args.stores):
+            store_id = str(uuid.uuid4())
+            await repo.insert_merchant({"id": store_id, "restaurant_name": f"Store {o}-{s}",
+                                        "username": f"store{o}_{s}", "password": "pw", "role": "manager",
+                                        "owner_id": owner_id})
+            stores.append(store_id)
+
+            lottery_id = str(uuid.uuid4())
+            await repo.insert_lottery({"id": lottery_id, "merchant_id": store_id, "name": "Lucky draw", "prizes": [
+                {"id": str(uuid.uuid4()), "name": "Coupon", "probability": 20.0},
+                {"id": str(uuid.uuid4()), "name": "Dessert", "probability": 5.0}
+            ]})
+
+            for v in range(args.surveys):
+                questions = [
+                    {"id": str(uuid.uuid4()), "text": "How was the food?", "type": "choice", "allow_other": False,
+                     "options": ["Great", "OK", "Bad"]},
+                    {"id": str(uuid.uuid4()), "text": "Anything else?", "type": "text", "allow_other": False,
+                     "options": []}
+                ]
+                survey = {"id": str(uuid.uuid4()), "merchant_id": store_id, "name": f"Survey {v}",
+                          "lottery_id": lottery_id, "questions": questions,
+                          "created_at": (now - timedelta(days=v)).isoformat()}
+                await repo.insert_survey(survey)
+                surveys.append(survey)
+
+    batch = []
+    for _ in range(args.responses):
+        survey = rng.choice(surveys)
+        choice_q, text_q = survey["questions"]
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "survey_id": survey["id"],
+            "customer_id": str(uuid.uuid4()),
+            "answers": {choice_q["id"]: rng.choice(choice_q["options"]),
+                        text_q["id"]: rng.choice(["", "Nice staff", "Too slow", "Will come again"])},
+            "submitted_at": (now - timedelta(seconds=rng.randrange(args.days * 86400))).isoformat()
+        })
+        if len(batch) >= 5000:
+            await repo.insert_responses(batch)
+            batch = []
+    await repo.insert_responses(batch)
+
+    await rollup_service.rebuild()
+    return {"owners": owners, "stores": stores, "surveys": surveys}
+
+
+def make_request(endpoint: str, data: dict, rng: random.Random):
+    """
+    Returns (method, url, json body) for one request against `endpoint`.
+    """
+    if endpoint == "submit_response":
+        survey = rng.choice(data["surveys"])
+        choice_q, text_q = survey["questions"]
+        return "POST", "/api/responses/", {
+            "survey_id": survey["id"],
+            "customer_id": str(uuid.uuid4()),
+            "answers": {choice_q["id"]: rng.choice(choice_q["options"]), text_q["id"]: "load test"}
+        }
+
+    owner_id = rng.choice(data["owners"])
+    if endpoint == "dashboard_stats":
+        return "GET", f"/api/analytics/dashboard-stats?merchant_id={owner_id}", None
+    if endpoint == "trends":
+        return "GET", f"/api/analytics/trends?merchant_id={owner_id}&view_mode=month", None
+    if endpoint == "dashboard":
+        return "GET", f"/api/analytics/dashboard?merchant_id={owner_id}&periods=month", None
+    if endpoint == "get_surveys":
+        return "GET", f"/api/surveys/?merchant_id={owner_id}", None
+    if endpoint == "get_lotteries":
+        return "GET", f"/api/lotteries/?merchant_id={rng.choice(data['stores'])}", None
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+async def run_level(client, endpoint: str, concurrency: int, total: int, data: dict, rng: random.Random) -> dict:
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, body = make_request(endpoint, data, rng)
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2)
+    }
+
+
+async def run(args) -> dict:
+    # The backend is chosen from the environment when these modules load
+    import httpx
+    import database
+    import main
+
+    rng = random.Random(args.seed)
+    results = []
+
+    async with main.app.router.lifespan_context(main.app):
+        seed_start = time.perf_counter()
+        data = await seed(args, rng)
+        seed_s = time.perf_counter() - seed_start
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            for endpoint in args.endpoints:
+                await run_level(client, endpoint, 1, args.warmup, data, rng)  # fills per-worker caches
+                for concurrency in args.concurrency:
+                    results.append(await run_level(client, endpoint, concurrency, args.requests, data, rng))
+
+    return {
+        "backend": database.DB_BACKEND,
+        "dataset": {"owners": args.owners, "stores_per_owner": args.stores, "surveys_per_store": args.surveys,
+                    "responses": args.responses, "days": args.days, "seed_seconds": round(seed_s, 2)},
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--owners", type=int, default=5)
+    parser.add_argument("--stores", type=int, default=4, help="stores per owner")
+    parser.add_argument("--surveys", type=int, default=2, help="surveys per store")
+    parser.add_argument("--responses", type=int, default=20000, help="seeded responses in total")
+    parser.add_argument("--days", type=int, default=400, help="seeded responses spread over this many days")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="SQLite file to seed (default: a fresh temporary file)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = args.db or os.path.join(workdir, "loadtest.db")
+    os.environ.setdefault("INGEST_JOURNAL_DIR", os.path.join(workdir, "journal"))
+    # Measure capacity, not the per-survey admission limit (override to test shedding)
+    os.environ.setdefault("SUBMIT_RATE_PER_SURVEY", "0")
+
+    report = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{'endpoint':<16} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for r in report["results"]:
+            print(f"{r['endpoint']:<16} {r['concurrency']:>5} {r['throughput_rps']:>8} {r['p50_ms']:>8} "
+                  f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,283 +1,438 @@
 import os
 import time
-from supabase import create_client, Client
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
+from cache import TTLCache
+from repositories.base import Repository
 
 # 加载 .env 文件中的环境变量
 load_dotenv()
 
+# 'supabase' (default) or 'sqlite' (local file, see repositories/sqlite_repo.py)
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/restaurant.db")
+# Warm the backend (connections, hot tables) during startup, before traffic is accepted
+DB_WARMUP = os.getenv("DB_WARMUP", "1") != "0"
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+# Merchant rows and owner -> sub-store lists, cached per worker
+MERCHANT_CACHE_TTL = float(os.getenv("MERCHANT_CACHE_TTL", "60"))
+MERCHANT_CACHE_SIZE = int(os.getenv("MERCHANT_CACHE_SIZE", "5000"))
+
+if DB_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
     print("Warning: SUPABASE_URL or SUPABASE_KEY not found in environment variables.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Created by init_client() (called from the app lifespan in main.py, or by CLI entry points):
+# the Supabase client needs a running event loop.
+repo: Optional[Repository] = None
+
+
+async def init_client():
+    global repo
+    if repo is None:
+        # Imported here so a SQLite deployment does not need the supabase package
+        if DB_BACKEND == "sqlite":
+            from repositories.sqlite_repo import SQLiteRepository
+            repo = SQLiteRepository(SQLITE_PATH)
+        else:
+            from repositories.supabase_repo import SupabaseRepository
+            repo = await SupabaseRepository.connect(SUPABASE_URL, SUPABASE_KEY)
+        print(f"✅ Database backend: {DB_BACKEND}")
+    return repo
+
+
+async def warm_up():
+    if not DB_WARMUP:
+        return
+    started = time.perf_counter()
+    try:
+        await repo.warm_up()
+    except Exception as e:
+        # A cold backend must not keep the worker from starting; requests retry on their own
+        print(f"⚠️ DB warm-up failed: {e}")
+        return
+    print(f"✅ Database warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+async def close_client():
+    global repo
+    if repo is not None:
+        await repo.close()
+        repo = None
 
 
 # ==========================================
-# 🛡️ Safe Execute Wrapper (Retry Logic)
+# 🔢 写入版本 (Write counters)
 # ==========================================
-def execute_safe(query_builder: Any, retries: int = 3, delay: int = 1):
+# Shared by all workers (entity_versions table, bumped by triggers on every write to
+# merchants / surveys / lotteries); the listing ETags are derived from them
+_seen_merchants_version: Optional[int] = None
+
+
+async def get_versions() -> Dict[str, int]:
     """
-    Wraps Supabase execute calls with retry logic to handle cold starts or network blips.
+    Current write counter of each table. A merchants counter moved by any worker
+    (including this one) also drops this worker's merchant caches, so a listing built
+    right after reading the counters never pairs a new tag with stale cached merchants.
     """
-    last_exception = None
-    for i in range(retries):
-        try:
-            return query_builder.execute()
-        except Exception as e:
-            print(f"⚠️ DB Query failed (Attempt {i + 1}/{retries}): {e}")
-            last_exception = e
-            time.sleep(delay)
-    # If all retries fail, raise the last exception
-    raise last_exception
+    global _seen_merchants_version
+    versions = await repo.get_versions()
+    merchants_version = versions.get("merchants", 0)
+    if merchants_version != _seen_merchants_version:
+        merchant_cache.clear()
+        merchant_subs_cache.clear()
+        _seen_merchants_version = merchants_version
+    return versions
 
 
 # ==========================================
 # 👤 商户 (Merchants)
 # ==========================================
-def register_merchant(merchant_data: dict):
+# Cached values are shared between callers: treat them as read-only.
+merchant_cache = TTLCache("merchants", MERCHANT_CACHE_TTL, MERCHANT_CACHE_SIZE)
+merchant_subs_cache = TTLCache("merchant_subs", MERCHANT_CACHE_TTL, MERCHANT_CACHE_SIZE)
+
+
+def invalidate_merchant(merchant_id: str, owner_id: Optional[str] = None):
+    merchant_cache.invalidate(merchant_id)
+    # The merchant may itself be an owner, or be listed under one
+    merchant_subs_cache.invalidate(merchant_id)
+    merchant_subs_cache.invalidate(owner_id)
+
+
+async def register_merchant(merchant_data: dict):
     # 检查 username 是否存在
-    exist = execute_safe(supabase.table('merchants').select('id').eq('username', merchant_data['username']))
-    if exist.data:
+    if await repo.username_taken(merchant_data['username']):
         raise ValueError("Username already exists")
 
-    response = execute_safe(supabase.table('merchants').insert(merchant_data))
-    return response.data[0]
+    merchant = await repo.insert_merchant(merchant_data)
+    invalidate_merchant(merchant_data['id'], merchant_data.get('owner_id'))
+    return merchant
+
 
+async def get_existing_usernames(usernames: List[str]) -> set:
+    return await repo.existing_usernames(usernames)
 
-def update_merchant(merchant_id: str, update_data: dict):
+
+async def register_merchants(rows: List[dict]):
+    """
+    Inserts already validated merchants in one statement (all or nothing); usernames
+    must have been checked with get_existing_usernames.
+    """
+    merchants = await repo.insert_merchants(rows)
+    for row in rows:
+        invalidate_merchant(row['id'], row.get('owner_id'))
+    return merchants
+
+
+async def update_merchant(merchant_id: str, update_data: dict):
     if 'username' in update_data:
-        exist = execute_safe(
-            supabase.table('merchants').select('id').eq('username', update_data['username']).neq('id', merchant_id))
-        if exist.data:
+        if await repo.username_taken(update_data['username'], exclude_id=merchant_id):
             raise ValueError("Username already exists")
 
-    response = execute_safe(supabase.table('merchants').update(update_data).eq('id', merchant_id))
-    if response.data:
-        return response.data[0]
-    return None
+    merchant = await repo.update_merchant(merchant_id, update_data)
+    invalidate_merchant(merchant_id, merchant.get('owner_id') if merchant else None)
+    return merchant
+
+
+async def delete_merchant(merchant_id: str):
+    deleted = await repo.delete_merchant(merchant_id)
+    invalidate_merchant(merchant_id, deleted.get('owner_id') if deleted else None)
+    return deleted
 
 
-def delete_merchant(merchant_id: str):
-    response = execute_safe(supabase.table('merchants').delete().eq('id', merchant_id))
-    return response
+async def login_merchant(username: str):
+    merchant = await repo.get_merchant_by_username(username)
+    if merchant:
+        # Warm the cache: the dashboard resolves this merchant right after login
+        merchant_cache.set(merchant['id'], merchant)
+    return merchant
 
 
-def login_merchant(username: str):
-    response = execute_safe(supabase.table('merchants').select("*").eq('username', username))
-    if response.data:
-        return response.data[0]
-    return None
+async def get_merchant_by_id(merchant_id: str):
+    cached = merchant_cache.get(merchant_id)
+    if cached is not None:
+        return cached
 
+    merchant = await repo.get_merchant(merchant_id)
+    if merchant:
+        merchant_cache.set(merchant_id, merchant)
+    return merchant
 
-def get_merchant_by_id(merchant_id: str):
-    response = execute_safe(supabase.table('merchants').select("*").eq('id', merchant_id))
-    if response.data:
-        return response.data[0]
-    return None
 
+async def get_all_merchants():
+    return await repo.list_merchants()
 
-def get_all_merchants():
-    response = execute_safe(supabase.table('merchants').select("*"))
-    return response.data
 
+async def get_merchants_by_owner(owner_id: str):
+    cached = merchant_subs_cache.get(owner_id)
+    if cached is not None:
+        return cached
 
-def get_merchants_by_owner(owner_id: str):
-    response = execute_safe(supabase.table('merchants').select("*").eq('owner_id', owner_id))
-    return response.data
+    subs = await repo.list_merchants(owner_id=owner_id)
+    merchant_subs_cache.set(owner_id, subs)
+    return subs
 
 
-def get_owner_count():
-    response = execute_safe(supabase.table('merchants').select("id", count='exact').eq('role', 'owner'))
-    return response.count
+async def get_owner_count():
+    return await repo.count_merchants('owner')
 
 
 # ==========================================
 # 📋 问卷 (Surveys)
 # ==========================================
 
-def insert_survey(survey_data: dict):
-    response = execute_safe(supabase.table('surveys').insert(survey_data))
-    return response.data[0]
+async def insert_survey(survey_data: dict):
+    return await repo.insert_survey(survey_data)
 
 
-def update_survey(survey_id: str, survey_data: dict):
-    response = execute_safe(supabase.table('surveys').update(survey_data).eq('id', survey_id))
-    if response.data:
-        return response.data[0]
-    return None
+async def insert_surveys(rows: List[dict]):
+    return await repo.insert_surveys(rows)
 
 
-def delete_survey(survey_id: str):
-    response = execute_safe(supabase.table('surveys').delete().eq('id', survey_id))
-    return response
+async def update_survey(survey_id: str, survey_data: dict):
+    return await repo.update_survey(survey_id, survey_data)
 
 
-def get_surveys_by_merchant(merchant_id: str):
-    merchant = get_merchant_by_id(merchant_id)
+async def delete_survey(survey_id: str):
+    return await repo.delete_survey(survey_id)
+
+
+async def get_surveys_by_merchant(merchant_id: str, merchant: Optional[dict] = None):
+    # Callers that already resolved the merchant can pass it in to skip the lookup
+    if merchant is None:
+        merchant = await get_merchant_by_id(merchant_id)
 
     if merchant and merchant.get('role') == 'owner':
-        subs = get_merchants_by_owner(merchant_id)
-        ids = [merchant_id] + [m['id'] for m in subs]
-        response = execute_safe(
-            supabase.table('surveys').select("*").in_('merchant_id', ids).order('created_at', desc=True))
-    else:
-        response = execute_safe(
-            supabase.table('surveys').select("*").eq('merchant_id', merchant_id).order('created_at', desc=True))
+        subs = await get_merchants_by_owner(merchant_id)
+        return await repo.list_surveys([merchant_id] + [m['id'] for m in subs])
 
-    return response.data
+    return await repo.list_surveys([merchant_id])
 
 
-def get_all_surveys_admin():
-    response = execute_safe(supabase.table('surveys').select("*").order('created_at', desc=True))
-    return response.data
+async def get_all_surveys_admin():
+    return await repo.list_surveys()
 
 
-def get_survey_by_id(survey_id: str):
-    response = execute_safe(supabase.table('surveys').select("*").eq('id', survey_id))
-    if response.data:
-        return response.data[0]
-    return None
+async def get_survey_by_id(survey_id: str):
+    return await repo.get_survey(survey_id)
 
 
-def get_survey_ids_by_merchant(merchant_id: str):
-    data = get_surveys_by_merchant(merchant_id)
+async def get_survey_ids_by_merchant(merchant_id: str, merchant: Optional[dict] = None):
+    data = await get_surveys_by_merchant(merchant_id, merchant)
     return [s['id'] for s in data]
 
 
-def get_all_survey_ids():
-    response = execute_safe(supabase.table('surveys').select("id"))
-    return [s['id'] for s in response.data]
+async def get_all_survey_ids():
+    return await repo.list_survey_ids()
 
 
 # ==========================================
 # 🎁 抽奖 (Lotteries)
 # ==========================================
 
-def insert_lottery(lottery_data: dict):
-    response = execute_safe(supabase.table('lotteries').insert(lottery_data))
-    return response.data[0]
+async def insert_lottery(lottery_data: dict):
+    return await repo.insert_lottery(lottery_data)
+
 
+async def insert_lotteries(rows: List[dict]):
+    return await repo.insert_lotteries(rows)
 
-def update_lottery(lottery_id: str, lottery_data: dict):
-    response = execute_safe(supabase.table('lotteries').update(lottery_data).eq('id', lottery_id))
-    if response.data:
-        return response.data[0]
-    return None
 
+async def update_lottery(lottery_id: str, lottery_data: dict):
+    return await repo.update_lottery(lottery_id, lottery_data)
 
-def delete_lottery(lottery_id: str):
-    response = execute_safe(supabase.table('lotteries').delete().eq('id', lottery_id))
-    return response
 
+async def delete_lottery(lottery_id: str):
+    return await repo.delete_lottery(lottery_id)
 
-def get_lotteries_by_merchant(merchant_id: str):
-    merchant = get_merchant_by_id(merchant_id)
+
+async def get_lotteries_by_merchant(merchant_id: str, merchant: Optional[dict] = None):
+    if merchant is None:
+        merchant = await get_merchant_by_id(merchant_id)
 
     if not merchant:
         return []
 
     if merchant.get('role') == 'owner':
-        subs = get_merchants_by_owner(merchant_id)
+        subs = await get_merchants_by_owner(merchant_id)
         ids = [merchant_id] + [m['id'] for m in subs]
-        response = execute_safe(supabase.table('lotteries').select("*").in_('merchant_id', ids))
     else:
         ids = [merchant_id]
         if merchant.get('owner_id'):
             ids.append(merchant['owner_id'])
-        response = execute_safe(supabase.table('lotteries').select("*").in_('merchant_id', ids))
 
-    return response.data
+    return await repo.list_lotteries(ids)
 
 
-def get_all_lotteries_admin():
-    response = execute_safe(supabase.table('lotteries').select("*"))
-    return response.data
+async def get_all_lotteries_admin():
+    return await repo.list_lotteries()
 
 
-def get_lottery_by_id(lottery_id: str):
-    response = execute_safe(supabase.table('lotteries').select("*").eq('id', lottery_id))
-    if response.data:
-        return response.data[0]
-    return None
+async def get_lottery_by_id(lottery_id: str):
+    return await repo.get_lottery(lottery_id)
 
 
 # ==========================================
 # 📝 回复 (Responses)
 # ==========================================
 
-def insert_response(response_data: dict):
-    response = execute_safe(supabase.table('responses').insert(response_data))
-    return response.data[0]
+async def insert_response(response_data: dict):
+    return await repo.insert_response(response_data)
 
 
-def get_responses(survey_id: Optional[str] = None):
-    all_responses = []
-    batch_size = 1000
-    start = 0
-    max_limit = 10000
+async def get_response_by_id(response_id: str):
+    return await repo.get_response(response_id)
 
+
+async def get_responses_page(survey_ids: Optional[List[str]] = None, after: Optional[tuple] = None,
+                             limit: int = 1000, columns: str = "*"):
+    """
+    One keyset page, newest first, ordered by (submitted_at, id).
+    `after` is the (submitted_at, id) of the last row of the previous page.
+    """
+    wanted = None
+    if columns != "*":
+        # The cursor columns are always needed
+        wanted = list(dict.fromkeys(["id", "submitted_at"] + [c.strip() for c in columns.split(",")]))
+    return await repo.responses_page(survey_ids, after, limit, wanted)
+
+
+async def iter_responses(survey_ids: Optional[List[str]] = None, columns: str = "*", page_size: int = 1000,
+                         after: Optional[tuple] = None):
+    """
+    Yields keyset pages until the end of the table. Each page costs the same
+    regardless of depth, and only one page is held in memory at a time.
+    """
     while True:
-        end = start + batch_size - 1
-        query = supabase.table('responses').select("*")
+        page = await get_responses_page(survey_ids, after, page_size, columns)
 
-        if survey_id:
-            query = query.eq('survey_id', survey_id)
+        if not page:
+            break
 
-        # Wrap query in execute_safe
-        response = execute_safe(query.order('submitted_at', desc=True).range(start, end))
-        data = response.data
+        yield page
 
-        if not data:
+        if len(page) < page_size:
             break
 
-        all_responses.extend(data)
+        after = (page[-1]['submitted_at'], page[-1]['id'])
 
-        if len(data) < batch_size or len(all_responses) >= max_limit:
+
+async def get_responses(survey_id: Optional[str] = None):
+    all_responses = []
+    max_limit = 10000
+
+    async for page in iter_responses([survey_id] if survey_id else None):
+        all_responses.extend(page)
+
+        if len(all_responses) >= max_limit:
             break
 
-        start += batch_size
+    return all_responses[:max_limit]
+
+
+async def insert_responses(rows: List[dict]):
+    """
+    Bulk insert. Rows whose id already exists are skipped, so replaying a batch is safe;
+    only the newly inserted rows are returned.
+    """
+    if not rows:
+        return []
+    return await repo.insert_responses(rows)
+
 
-    return all_responses
+async def iter_response_answers(survey_id: str, batch_size: int = 1000):
+    """
+    Yields the `answers` column of a survey's responses one page at a time,
+    so aggregations can run server-side without buffering the whole table.
+    """
+    async for page in iter_responses([survey_id], columns="answers", page_size=batch_size):
+        yield [r.get('answers') or {} for r in page]
 
 
-def get_response_timestamps(survey_ids: List[str]):
+async def get_response_timestamps(survey_ids: List[str]):
     if not survey_ids:
         return []
 
     all_timestamps = []
-    batch_size = 1000
-    start = 0
     max_limit = 100000
 
-    while True:
-        end = start + batch_size - 1
-        # Wrap query in execute_safe
-        response = execute_safe(supabase.table('responses').select("submitted_at") \
-                                .in_('survey_id', survey_ids) \
-                                .range(start, end))
-
-        data = response.data
+    async for page in iter_responses(survey_ids, columns="submitted_at"):
+        all_timestamps.extend(r['submitted_at'] for r in page)
 
-        if not data:
+        if len(all_timestamps) >= max_limit:
             break
 
-        for r in data:
-            all_timestamps.append(r['submitted_at'])
+    return all_timestamps
 
-        if len(data) < batch_size or len(all_timestamps) >= max_limit:
-            break
 
-        start += batch_size
+async def count_responses_by_surveys(survey_ids: List[str]):
+    if not survey_ids:
+        return 0
+    return await repo.count_responses(survey_ids)
 
-    return all_timestamps
+
+# ==========================================
+# 📈 每日汇总 (Daily Rollups)
+# ==========================================
+# Backed by the `response_daily_counts` table and the `increment_response_rollup`
+# function, see migrations/001_response_daily_counts.sql.
+
+async def increment_daily_count(survey_id: str, day: str, delta: int = 1):
+    await repo.increment_daily_count(survey_id, day, delta)
 
 
-def count_responses_by_surveys(survey_ids: List[str]):
+async def get_daily_counts(survey_ids: List[str], start_day: str, end_day: str):
     if not survey_ids:
-        return 0
-    response = execute_safe(supabase.table('responses').select("id", count='exact').in_('survey_id', survey_ids))
-    return response.count
+        return []
+    return await repo.daily_counts(survey_ids, start_day, end_day)
+
+
+async def replace_daily_counts(survey_ids: List[str], rows: List[dict]):
+    """
+    Replaces the rollup rows of the given surveys (used by the rebuild command).
+    """
+    await repo.replace_daily_counts(survey_ids, rows)
+
+
+async def iter_response_days(survey_ids: Optional[List[str]] = None, batch_size: int = 1000):
+    """
+    Yields (survey_id, submitted_at) pages over the responses table, for rollup rebuilds.
+    """
+    async for page in iter_responses(survey_ids, columns="survey_id", page_size=batch_size):
+        yield page
+
+
+# ==========================================
+# 🤖 AI 分析缓存 (AI Analyses)
+# ==========================================
+# Backed by the `ai_analyses` table, see migrations/003_ai_analyses.sql.
+
+async def get_response_high_water(survey_id: str):
+    """
+    Returns (response_count, latest submitted_at) of a survey in one query.
+    """
+    return await repo.response_high_water(survey_id)
+
+
+async def get_latest_analysis(survey_id: str, language: str):
+    return await repo.latest_analysis(survey_id, language)
+
+
+async def insert_analysis(analysis_data: dict):
+    return await repo.insert_analysis(analysis_data)
+
+
+# ==========================================
+# ⏳ 后台任务 (Background Jobs)
+# ==========================================
+# Backed by the `background_jobs` table, see migrations/004_background_jobs.sql.
+
+async def upsert_job(job_data: dict):
+    await repo.upsert_job(job_data)
+
+
+async def get_job(job_id: str):
+    return await repo.get_job(job_id)
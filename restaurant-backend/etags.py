@@ -0,0 +1,51 @@
+"""
+Version-based ETags for the survey, lottery and merchant listings.
+
+Every write to merchants, surveys or lotteries bumps that table's counter in the
+`entity_versions` table (a trigger, in the write's own transaction). A listing's ETag
+is derived from the counters it depends on and the requester's scope, so checking
+If-None-Match costs one read of that tiny table instead of the listing query, and a
+matching tag is answered with 304.
+
+The counters live in the datastore, not in the worker: a write on any worker makes
+every tag issued before it stale on all workers, so a client always sees its own
+writes. When the counters cannot be read the listing is served untagged.
+"""
+import hashlib
+from typing import Optional, Sequence
+from fastapi import Response
+import database
+
+
+async def make(tables: Sequence[str], scope: str) -> Optional[str]:
+    """
+    Weak ETag of a listing that reads `tables` on behalf of `scope` (requester / filter).
+    Compute it before querying, so a write racing the read yields a tag that is already stale.
+    """
+    try:
+        versions = await database.get_versions()
+    except Exception as e:
+        print(f"⚠️ ETag versions unavailable, serving untagged: {e}")
+        return None
+    raw = "|".join(str(versions.get(t, 0)) for t in tables) + f"|{scope}"
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+def matches(if_none_match: Optional[str], tag: Optional[str]) -> bool:
+    if not if_none_match or not tag:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison: W/"x" and "x" match
+    return "*" in candidates or tag.removeprefix("W/") in (c.removeprefix("W/") for c in candidates)
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "private, no-cache"})
+
+
+def tag_response(response: Response, tag: Optional[str]):
+    if not tag:
+        return
+    # no-cache: browsers keep the body but revalidate every time (If-None-Match -> 304)
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = "private, no-cache"
@@ -1,15 +1,51 @@
 
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 # Import Routers
-from routers import auth, merchants, lotteries, surveys, responses, analytics
+from routers import auth, merchants, lotteries, surveys, responses, analytics, exports
+import database
+import cache
+import metrics
+from services import ai_service, ingest_service, job_service
 
 # Force reload of .env to ensure we get the latest variables
 load_dotenv(override=True)
 
-app = FastAPI(title="Restaurant Survey & Lottery API")
+# Seconds spent in each lifespan startup step of this worker (see benchmarks/bench_startup.py)
+startup_timings = {}
+
+
+async def _timed_step(name: str, step):
+    started = time.perf_counter()
+    await step()
+    startup_timings[name] = time.perf_counter() - started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Storage backend (DB_BACKEND); the async Supabase client is bound to this worker's event loop
+    await _timed_step("init_client", database.init_client)
+    # Opens pooled connections and touches hot tables before this worker reports ready
+    await _timed_step("warm_up", database.warm_up)
+    # Replays unflushed journaled responses, then starts the flusher (journal mode only)
+    await _timed_step("ingest_start", ingest_service.start)
+    # Re-resolves the Gemini model periodically; the SDK itself is loaded on the first analysis
+    model_refresh = asyncio.create_task(ai_service.model_refresh_loop())
+    print("✅ Worker ready: " + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in startup_timings.items()))
+    yield
+    model_refresh.cancel()
+    await job_service.shutdown()
+    await ingest_service.stop()
+    await database.close_client()
+
+
+app = FastAPI(title="Restaurant Survey & Lottery API", lifespan=lifespan)
 
 # --- CORS ---
 # 在前后端分离部署时（Vercel + Render），必须正确配置 CORS。
@@ -25,6 +61,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Metrics ---
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Labelled by route template (not raw path) to keep the series count bounded
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(request.method, getattr(route, "path", "unmatched"), str(status),
+                                              value=time.perf_counter() - started)
+
 # --- Include Routers ---
 app.include_router(auth.router)
 app.include_router(merchants.router)
@@ -32,7 +83,25 @@ app.include_router(lotteries.router)
 app.include_router(surveys.router)
 app.include_router(responses.router)
 app.include_router(analytics.router)
+app.include_router(exports.router)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Restaurant API is running (Backend Only)."}
+
+
+@app.get("/cache-stats")
+async def cache_stats():
+    # Per-worker hit/miss counters of the in-process caches
+    return cache.all_stats()
+
+
+@app.get("/ingest-stats")
+async def ingest_stats():
+    return ingest_service.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # Per-worker series in Prometheus text format (scrape each worker, or aggregate upstream)
+    return PlainTextResponse(metrics.render_all(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,125 @@
+import bisect
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+# Every metric registers itself here; /metrics renders them all in Prometheus text format
+_registry: Dict[str, "Metric"] = {}
+
+# Seconds; covers a cached lookup up to a slow Gemini call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        return []
+
+
+class Counter(Metric):
+    """
+    Monotonic count per label set.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(Metric):
+    """
+    Cumulative-bucket histogram per label set (observations in seconds unless named otherwise).
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, *labels: str, value: float):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {state[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render_all() -> str:
+    return "\n".join(m.render() for m in _registry.values()) + "\n"
+
+
+# --- HTTP (main.py middleware) ---
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "API request latency by route template", ("method", "route", "status"))
+
+# --- Submit admission control (admission_service) ---
+submit_rejections = Counter(
+    "submit_rejections_total", "Submissions shed by rate limits or the concurrency cap", ("reason",))
+
+# --- Database (execute_safe) ---
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Supabase query latency, including retries", ("table", "operation"))
+db_query_retries = Counter(
+    "db_query_retries_total", "Supabase query attempts that failed and were retried", ("table", "operation"))
+db_query_failures = Counter(
+    "db_query_failures_total", "Supabase queries that failed after all retries", ("table", "operation"))
+db_query_rows = Counter(
+    "db_query_rows_total", "Rows returned by Supabase queries", ("table", "operation"))
+
+# --- Gemini (ai_service) ---
+gemini_requests = Counter(
+    "gemini_requests_total", "Gemini API calls by outcome", ("model", "call", "outcome"))
+gemini_request_duration = Histogram(
+    "gemini_request_duration_seconds", "Gemini API call latency", ("model", "call"))
+gemini_tokens = Counter(
+    "gemini_tokens_total", "Tokens reported by Gemini usage metadata", ("model", "kind"))
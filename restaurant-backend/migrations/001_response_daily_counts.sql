@@ -0,0 +1,34 @@
+-- Per-survey daily response counts used by the dashboard endpoints.
+-- Populate with: python -m services.rollup_service rebuild
+
+create table if not exists response_daily_counts (
+    survey_id uuid not null,
+    day date not null,
+    count bigint not null default 0,
+    primary key (survey_id, day)
+);
+
+create index if not exists response_daily_counts_day_idx on response_daily_counts (day);
+
+-- Atomic increment, called by the API after each inserted response
+create or replace function increment_response_rollup(p_survey_id uuid, p_day date, p_delta bigint default 1)
+returns void
+language sql
+as $$
+    insert into response_daily_counts (survey_id, day, count)
+    values (p_survey_id, p_day, p_delta)
+    on conflict (survey_id, day)
+    do update set count = response_daily_counts.count + excluded.count;
+$$;
+
+-- Replaces the rollup rows of the given surveys in one transaction (used by the
+-- rebuild command, one call per batch of surveys)
+create or replace function replace_response_rollup(p_survey_ids uuid[], p_rows jsonb)
+returns void
+language sql
+as $$
+    delete from response_daily_counts where survey_id = any(p_survey_ids);
+    insert into response_daily_counts (survey_id, day, count)
+    select survey_id, day, count
+    from jsonb_to_recordset(p_rows) as r(survey_id uuid, day date, count bigint);
+$$;
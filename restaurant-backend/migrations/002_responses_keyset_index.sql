@@ -0,0 +1,6 @@
+-- Keyset pagination over responses: newest first, (submitted_at, id) as the cursor.
+create index if not exists responses_survey_submitted_idx
+    on responses (survey_id, submitted_at desc, id desc);
+
+create index if not exists responses_submitted_idx
+    on responses (submitted_at desc, id desc);
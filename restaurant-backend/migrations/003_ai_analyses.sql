@@ -0,0 +1,15 @@
+-- Stored AI survey reports, reused while the survey's data is unchanged.
+create table if not exists ai_analyses (
+    id uuid primary key default gen_random_uuid(),
+    survey_id uuid not null,
+    language text not null,
+    question_version text not null,
+    response_count bigint not null,
+    latest_submitted_at text,
+    model text,
+    analysis text not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists ai_analyses_lookup_idx
+    on ai_analyses (survey_id, language, created_at desc);
@@ -0,0 +1,14 @@
+-- Background job records (exports, AI analyses), so any worker can answer a status poll.
+create table if not exists background_jobs (
+    id uuid primary key,
+    kind text not null,
+    status text not null,
+    params jsonb not null default '{}'::jsonb,
+    result jsonb,
+    error text,
+    created_at timestamptz not null,
+    started_at timestamptz,
+    finished_at timestamptz
+);
+
+create index if not exists background_jobs_created_idx on background_jobs (created_at desc);
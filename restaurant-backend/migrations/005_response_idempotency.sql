@@ -0,0 +1,5 @@
+-- Lottery result of each submission. The response id doubles as the client's
+-- idempotency key (primary key = uniqueness check), so a retried submission finds
+-- its row and gets the original result back instead of a second draw.
+
+alter table responses add column if not exists lottery_result jsonb;
@@ -0,0 +1,34 @@
+-- Write counters behind the listing ETags (etags.py). Every worker reads the same rows,
+-- so a tag issued by one worker is stale on all of them after any write. The counters
+-- are bumped by triggers, in the same transaction as the write they count.
+
+create table if not exists entity_versions (
+    name text primary key,
+    version bigint not null default 0
+);
+
+create or replace function bump_entity_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into entity_versions (name, version)
+    values (tg_table_name, 1)
+    on conflict (name)
+    do update set version = entity_versions.version + 1;
+    return null;
+end;
+$$;
+
+-- One bump per statement, so a bulk insert counts once
+drop trigger if exists merchants_entity_version on merchants;
+create trigger merchants_entity_version after insert or update or delete on merchants
+    for each statement execute function bump_entity_version();
+
+drop trigger if exists surveys_entity_version on surveys;
+create trigger surveys_entity_version after insert or update or delete on surveys
+    for each statement execute function bump_entity_version();
+
+drop trigger if exists lotteries_entity_version on lotteries;
+create trigger lotteries_entity_version after insert or update or delete on lotteries
+    for each statement execute function bump_entity_version();
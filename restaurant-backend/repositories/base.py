@@ -0,0 +1,173 @@
+"""
+Storage interface behind `database.py`.
+
+A backend only stores and fetches rows. Caching, owner -> store resolution and keyset
+iteration stay in `database.py`, so every backend behaves the same to the routers.
+Rows are plain dicts with the column names of the Supabase tables; JSON columns
+(questions, prizes, answers, job params/results) come back decoded.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class Repository(ABC):
+
+    async def warm_up(self):
+        """
+        Opens connections / touches hot tables before the worker takes traffic.
+        """
+
+    async def close(self):
+        pass
+
+    # --- Merchants ---
+    @abstractmethod
+    async def get_merchant(self, merchant_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def get_merchant_by_username(self, username: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def username_taken(self, username: str, exclude_id: Optional[str] = None) -> bool: ...
+
+    @abstractmethod
+    async def existing_usernames(self, usernames: List[str]) -> Set[str]:
+        """
+        The subset of `usernames` already registered, in one query.
+        """
+
+    @abstractmethod
+    async def list_merchants(self, owner_id: Optional[str] = None) -> List[dict]: ...
+
+    @abstractmethod
+    async def count_merchants(self, role: str) -> int: ...
+
+    @abstractmethod
+    async def insert_merchant(self, data: dict) -> dict: ...
+
+    @abstractmethod
+    async def insert_merchants(self, rows: List[dict]) -> List[dict]:
+        """
+        Inserts all rows in one statement/transaction (all or nothing).
+        """
+
+    @abstractmethod
+    async def update_merchant(self, merchant_id: str, data: dict) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def delete_merchant(self, merchant_id: str) -> Optional[dict]:
+        """
+        Returns the deleted row, if there was one.
+        """
+
+    # --- Surveys ---
+    @abstractmethod
+    async def get_survey(self, survey_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def list_surveys(self, merchant_ids: Optional[List[str]] = None) -> List[dict]:
+        """
+        Newest first; all surveys when `merchant_ids` is None.
+        """
+
+    @abstractmethod
+    async def list_survey_ids(self) -> List[str]: ...
+
+    @abstractmethod
+    async def insert_survey(self, data: dict) -> dict: ...
+
+    @abstractmethod
+    async def insert_surveys(self, rows: List[dict]) -> List[dict]:
+        """
+        Inserts all rows in one statement/transaction (all or nothing).
+        """
+
+    @abstractmethod
+    async def update_survey(self, survey_id: str, data: dict) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def delete_survey(self, survey_id: str) -> Optional[dict]: ...
+
+    # --- Lotteries ---
+    @abstractmethod
+    async def get_lottery(self, lottery_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def list_lotteries(self, merchant_ids: Optional[List[str]] = None) -> List[dict]: ...
+
+    @abstractmethod
+    async def insert_lottery(self, data: dict) -> dict: ...
+
+    @abstractmethod
+    async def insert_lotteries(self, rows: List[dict]) -> List[dict]:
+        """
+        Inserts all rows in one statement/transaction (all or nothing).
+        """
+
+    @abstractmethod
+    async def update_lottery(self, lottery_id: str, data: dict) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def delete_lottery(self, lottery_id: str) -> Optional[dict]: ...
+
+    # --- Responses ---
+    @abstractmethod
+    async def insert_response(self, data: dict) -> dict: ...
+
+    @abstractmethod
+    async def get_response(self, response_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def insert_responses(self, rows: List[dict]) -> List[dict]:
+        """
+        Skips rows whose id already exists; returns only the newly inserted ones.
+        """
+
+    @abstractmethod
+    async def responses_page(self, survey_ids: Optional[List[str]], after: Optional[Tuple[str, str]],
+                             limit: int, columns: Optional[List[str]] = None) -> List[dict]:
+        """
+        Newest first by (submitted_at, id), strictly after the `after` cursor.
+        `columns` None means every column.
+        """
+
+    @abstractmethod
+    async def count_responses(self, survey_ids: List[str]) -> int: ...
+
+    @abstractmethod
+    async def response_high_water(self, survey_id: str) -> Tuple[int, Optional[str]]:
+        """
+        (response count, latest submitted_at) of one survey.
+        """
+
+    # --- Daily rollups ---
+    @abstractmethod
+    async def increment_daily_count(self, survey_id: str, day: str, delta: int = 1): ...
+
+    @abstractmethod
+    async def daily_counts(self, survey_ids: List[str], start_day: str, end_day: str) -> List[dict]: ...
+
+    @abstractmethod
+    async def replace_daily_counts(self, survey_ids: List[str], rows: List[dict]): ...
+
+    # --- AI analyses ---
+    @abstractmethod
+    async def latest_analysis(self, survey_id: str, language: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    async def insert_analysis(self, data: dict) -> dict: ...
+
+    # --- Background jobs ---
+    @abstractmethod
+    async def upsert_job(self, data: dict): ...
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[dict]: ...
+
+    # --- Write counters (listing ETags) ---
+    @abstractmethod
+    async def get_versions(self) -> Dict[str, int]:
+        """
+        Write counter per table, bumped by the backend itself on every write to
+        merchants, surveys and lotteries (triggers).
+        """
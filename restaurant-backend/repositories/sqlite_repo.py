@@ -0,0 +1,406 @@
+"""
+Local SQLite backend (DB_BACKEND=sqlite), for profiling, load tests and small
+single-node deployments. Uses only the standard library.
+
+One connection per process in WAL mode; statements run on worker threads via
+asyncio.to_thread, serialized by a lock. Lists of ids are bound as one JSON
+parameter (`in (select value from json_each(?))`), so there is no bound-variable limit.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+from repositories.base import Repository
+
+SCHEMA = """
+create table if not exists merchants (
+    id text primary key,
+    restaurant_name text not null,
+    username text not null unique,
+    password text,
+    role text not null default 'manager',
+    owner_id text
+);
+create index if not exists merchants_owner_idx on merchants (owner_id);
+create index if not exists merchants_role_idx on merchants (role);
+
+create table if not exists surveys (
+    id text primary key,
+    merchant_id text not null,
+    name text not null,
+    lottery_id text,
+    questions text not null default '[]',
+    created_at text not null
+);
+create index if not exists surveys_merchant_idx on surveys (merchant_id, created_at desc);
+
+create table if not exists lotteries (
+    id text primary key,
+    merchant_id text not null,
+    name text not null,
+    prizes text not null default '[]'
+);
+create index if not exists lotteries_merchant_idx on lotteries (merchant_id);
+
+create table if not exists responses (
+    id text primary key,
+    survey_id text not null,
+    customer_id text,
+    answers text not null default '{}',
+    submitted_at text not null,
+    lottery_result text
+);
+create index if not exists responses_survey_submitted_idx on responses (survey_id, submitted_at desc, id desc);
+create index if not exists responses_submitted_idx on responses (submitted_at desc, id desc);
+
+create table if not exists response_daily_counts (
+    survey_id text not null,
+    day text not null,
+    count integer not null default 0,
+    primary key (survey_id, day)
+);
+create index if not exists response_daily_counts_day_idx on response_daily_counts (day);
+
+create table if not exists ai_analyses (
+    id text primary key,
+    survey_id text not null,
+    language text not null,
+    question_version text not null,
+    response_count integer not null,
+    latest_submitted_at text,
+    model text,
+    analysis text not null,
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+create index if not exists ai_analyses_lookup_idx on ai_analyses (survey_id, language, created_at desc);
+
+create table if not exists background_jobs (
+    id text primary key,
+    kind text not null,
+    status text not null,
+    params text not null default '{}',
+    result text,
+    error text,
+    created_at text not null,
+    started_at text,
+    finished_at text
+);
+create index if not exists background_jobs_created_idx on background_jobs (created_at desc);
+
+create table if not exists entity_versions (
+    name text primary key,
+    version integer not null default 0
+);
+""" + "".join(
+    # SQLite triggers are per row only: a bulk insert bumps once per row
+    f"""
+create trigger if not exists {table}_entity_version_{event} after {event} on {table}
+begin
+    insert into entity_versions (name, version) values ('{table}', 1)
+    on conflict (name) do update set version = version + 1;
+end;
+"""
+    for table in ("merchants", "surveys", "lotteries") for event in ("insert", "update", "delete"))
+
+# Columns stored as JSON text
+JSON_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "surveys": ("questions",),
+    "lotteries": ("prizes",),
+    "responses": ("answers", "lottery_result"),
+    "background_jobs": ("params", "result"),
+}
+RESPONSE_COLUMNS = ("id", "survey_id", "customer_id", "answers", "submitted_at", "lottery_result")
+
+_IN_LIST = "in (select value from json_each(?))"
+
+
+class SQLiteRepository(Repository):
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.execute("pragma journal_mode = wal")
+        self._conn.execute("pragma synchronous = normal")
+        self._conn.executescript(SCHEMA)
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        # Files created before a column existed (mirrors the `add column` migrations)
+        columns = {r[1] for r in self._conn.execute("pragma table_info(responses)")}
+        if "lottery_result" not in columns:
+            self._conn.execute("alter table responses add column lottery_result text")
+
+    async def warm_up(self):
+        # Pulls the hot tables' first pages into SQLite's page cache
+        for table in ("merchants", "surveys", "lotteries", "response_daily_counts"):
+            await self._scalar(f"select count(*) from (select 1 from {table} limit 1)")
+
+    async def close(self):
+        await asyncio.to_thread(self._conn.close)
+
+    # --- Plumbing ---
+    def _decode(self, table: str, row: sqlite3.Row) -> dict:
+        data = dict(row)
+        for col in JSON_COLUMNS.get(table, ()):
+            if data.get(col) is not None:
+                data[col] = json.loads(data[col])
+        return data
+
+    def _encode(self, table: str, data: dict) -> dict:
+        encoded = dict(data)
+        for col in JSON_COLUMNS.get(table, ()):
+            if encoded.get(col) is not None:
+                encoded[col] = json.dumps(encoded[col], ensure_ascii=False)
+        return encoded
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(locked)
+
+    async def _fetchall(self, table: str, sql: str, params: tuple = ()) -> List[dict]:
+        rows = await self._run(lambda: self._conn.execute(sql, params).fetchall())
+        return [self._decode(table, r) for r in rows]
+
+    async def _fetchone(self, table: str, sql: str, params: tuple = ()) -> Optional[dict]:
+        rows = await self._fetchall(table, sql, params)
+        return rows[0] if rows else None
+
+    async def _scalar(self, sql: str, params: tuple = ()):
+        return await self._run(lambda: self._conn.execute(sql, params).fetchone()[0])
+
+    async def _insert(self, table: str, data: dict) -> dict:
+        row = self._encode(table, data)
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        return await self._fetchone(table, f"insert into {table} ({cols}) values ({marks}) returning *",
+                                    tuple(row.values()))
+
+    async def _insert_many(self, table: str, rows: List[dict]) -> List[dict]:
+        encoded = [self._encode(table, r) for r in rows]
+
+        def insert_all():
+            inserted = []
+            with self._conn:
+                self._conn.execute("begin")
+                for row in encoded:
+                    cols = ", ".join(row)
+                    marks = ", ".join("?" for _ in row)
+                    inserted.append(self._conn.execute(f"insert into {table} ({cols}) values ({marks}) returning *",
+                                                       tuple(row.values())).fetchone())
+            return inserted
+
+        return [self._decode(table, r) for r in await self._run(insert_all)]
+
+    async def _update(self, table: str, row_id: str, data: dict) -> Optional[dict]:
+        if not data:
+            return await self._fetchone(table, f"select * from {table} where id = ?", (row_id,))
+        row = self._encode(table, data)
+        sets = ", ".join(f"{c} = ?" for c in row)
+        return await self._fetchone(table, f"update {table} set {sets} where id = ? returning *",
+                                    tuple(row.values()) + (row_id,))
+
+    async def _delete(self, table: str, row_id: str) -> Optional[dict]:
+        return await self._fetchone(table, f"delete from {table} where id = ? returning *", (row_id,))
+
+    # --- Merchants ---
+    async def get_merchant(self, merchant_id: str):
+        return await self._fetchone("merchants", "select * from merchants where id = ?", (merchant_id,))
+
+    async def get_merchant_by_username(self, username: str):
+        return await self._fetchone("merchants", "select * from merchants where username = ?", (username,))
+
+    async def username_taken(self, username: str, exclude_id: Optional[str] = None) -> bool:
+        return bool(await self._scalar("select count(*) from merchants where username = ? and id is not ?",
+                                       (username, exclude_id)))
+
+    async def existing_usernames(self, usernames: List[str]):
+        rows = await self._run(lambda: self._conn.execute(
+            f"select username from merchants where username {_IN_LIST}", (json.dumps(usernames),)).fetchall())
+        return {r[0] for r in rows}
+
+    async def list_merchants(self, owner_id: Optional[str] = None):
+        if owner_id:
+            return await self._fetchall("merchants", "select * from merchants where owner_id = ?", (owner_id,))
+        return await self._fetchall("merchants", "select * from merchants")
+
+    async def count_merchants(self, role: str) -> int:
+        return await self._scalar("select count(*) from merchants where role = ?", (role,))
+
+    async def insert_merchant(self, data: dict):
+        return await self._insert("merchants", data)
+
+    async def insert_merchants(self, rows: List[dict]):
+        return await self._insert_many("merchants", rows)
+
+    async def update_merchant(self, merchant_id: str, data: dict):
+        return await self._update("merchants", merchant_id, data)
+
+    async def delete_merchant(self, merchant_id: str):
+        return await self._delete("merchants", merchant_id)
+
+    # --- Surveys ---
+    async def get_survey(self, survey_id: str):
+        return await self._fetchone("surveys", "select * from surveys where id = ?", (survey_id,))
+
+    async def list_surveys(self, merchant_ids: Optional[List[str]] = None):
+        if merchant_ids is None:
+            return await self._fetchall("surveys", "select * from surveys order by created_at desc")
+        return await self._fetchall("surveys", f"select * from surveys where merchant_id {_IN_LIST} "
+                                               f"order by created_at desc", (json.dumps(merchant_ids),))
+
+    async def list_survey_ids(self):
+        return [r['id'] for r in await self._fetchall("surveys", "select id from surveys")]
+
+    async def insert_survey(self, data: dict):
+        return await self._insert("surveys", data)
+
+    async def insert_surveys(self, rows: List[dict]):
+        return await self._insert_many("surveys", rows)
+
+    async def update_survey(self, survey_id: str, data: dict):
+        return await self._update("surveys", survey_id, data)
+
+    async def delete_survey(self, survey_id: str):
+        return await self._delete("surveys", survey_id)
+
+    # --- Lotteries ---
+    async def get_lottery(self, lottery_id: str):
+        return await self._fetchone("lotteries", "select * from lotteries where id = ?", (lottery_id,))
+
+    async def list_lotteries(self, merchant_ids: Optional[List[str]] = None):
+        if merchant_ids is None:
+            return await self._fetchall("lotteries", "select * from lotteries")
+        return await self._fetchall("lotteries", f"select * from lotteries where merchant_id {_IN_LIST}",
+                                    (json.dumps(merchant_ids),))
+
+    async def insert_lottery(self, data: dict):
+        return await self._insert("lotteries", data)
+
+    async def insert_lotteries(self, rows: List[dict]):
+        return await self._insert_many("lotteries", rows)
+
+    async def update_lottery(self, lottery_id: str, data: dict):
+        return await self._update("lotteries", lottery_id, data)
+
+    async def delete_lottery(self, lottery_id: str):
+        return await self._delete("lotteries", lottery_id)
+
+    # --- Responses ---
+    async def insert_response(self, data: dict):
+        return await self._insert("responses", data)
+
+    async def get_response(self, response_id: str):
+        return await self._fetchone("responses", "select * from responses where id = ?", (response_id,))
+
+    async def insert_responses(self, rows: List[dict]):
+        encoded = [self._encode("responses", r) for r in rows]
+
+        def insert_all():
+            inserted = []
+            with self._conn:
+                self._conn.execute("begin")
+                for row, original in zip(encoded, rows):
+                    cols = ", ".join(row)
+                    marks = ", ".join("?" for _ in row)
+                    cur = self._conn.execute(f"insert or ignore into responses ({cols}) values ({marks})",
+                                             tuple(row.values()))
+                    if cur.rowcount:
+                        inserted.append(original)
+            return inserted
+
+        return await self._run(insert_all)
+
+    async def responses_page(self, survey_ids: Optional[List[str]], after: Optional[Tuple[str, str]],
+                             limit: int, columns: Optional[List[str]] = None):
+        if columns and not set(columns) <= set(RESPONSE_COLUMNS):
+            raise ValueError(f"Unknown response columns: {columns}")
+
+        where = []
+        params = []
+        if survey_ids and len(survey_ids) == 1:
+            # Equality lets the (survey_id, submitted_at, id) index deliver rows already in order
+            where.append("survey_id = ?")
+            params.append(survey_ids[0])
+        elif survey_ids:
+            where.append(f"survey_id {_IN_LIST}")
+            params.append(json.dumps(survey_ids))
+        if after:
+            where.append("(submitted_at, id) < (?, ?)")
+            params.extend(after)
+
+        sql = f"select {', '.join(columns) if columns else '*'} from responses"
+        if where:
+            sql += " where " + " and ".join(where)
+        sql += " order by submitted_at desc, id desc limit ?"
+        return await self._fetchall("responses", sql, tuple(params) + (limit,))
+
+    async def count_responses(self, survey_ids: List[str]) -> int:
+        return await self._scalar(f"select count(*) from responses where survey_id {_IN_LIST}",
+                                  (json.dumps(survey_ids),))
+
+    async def response_high_water(self, survey_id: str):
+        row = await self._fetchone("responses", "select count(*) as n, max(submitted_at) as latest "
+                                                "from responses where survey_id = ?", (survey_id,))
+        return row['n'], row['latest']
+
+    # --- Daily rollups ---
+    async def increment_daily_count(self, survey_id: str, day: str, delta: int = 1):
+        await self._run(lambda: self._conn.execute(
+            "insert into response_daily_counts (survey_id, day, count) values (?, ?, ?) "
+            "on conflict (survey_id, day) do update set count = count + excluded.count",
+            (survey_id, day, delta)))
+
+    async def daily_counts(self, survey_ids: List[str], start_day: str, end_day: str):
+        return await self._fetchall(
+            "response_daily_counts",
+            f"select survey_id, day, count from response_daily_counts where survey_id {_IN_LIST} "
+            f"and day between ? and ? order by day, survey_id",
+            (json.dumps(survey_ids), start_day, end_day))
+
+    async def replace_daily_counts(self, survey_ids: List[str], rows: List[dict]):
+        def replace():
+            with self._conn:
+                self._conn.execute("begin")
+                if survey_ids:
+                    self._conn.execute(f"delete from response_daily_counts where survey_id {_IN_LIST}",
+                                       (json.dumps(survey_ids),))
+                self._conn.executemany(
+                    "insert or replace into response_daily_counts (survey_id, day, count) values (?, ?, ?)",
+                    [(r['survey_id'], r['day'], r['count']) for r in rows])
+
+        await self._run(replace)
+
+    # --- AI analyses ---
+    async def latest_analysis(self, survey_id: str, language: str):
+        return await self._fetchone("ai_analyses", "select * from ai_analyses where survey_id = ? and language = ? "
+                                                   "order by created_at desc limit 1", (survey_id, language))
+
+    async def insert_analysis(self, data: dict):
+        if 'id' not in data:
+            data = {"id": str(uuid.uuid4()), **data}
+        return await self._insert("ai_analyses", data)
+
+    # --- Background jobs ---
+    async def upsert_job(self, data: dict):
+        row = self._encode("background_jobs", data)
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        await self._run(lambda: self._conn.execute(
+            f"insert or replace into background_jobs ({cols}) values ({marks})", tuple(row.values())))
+
+    async def get_job(self, job_id: str):
+        return await self._fetchone("background_jobs", "select * from background_jobs where id = ?", (job_id,))
+
+    # --- Write counters ---
+    async def get_versions(self):
+        rows = await self._fetchall("entity_versions", "select name, version from entity_versions")
+        return {r['name']: r['version'] for r in rows}
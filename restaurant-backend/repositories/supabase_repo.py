@@ -0,0 +1,353 @@
+"""
+Supabase (PostgREST) backend. Schema additions live in migrations/.
+"""
+import os
+import asyncio
+import random
+import time
+from typing import Any, List, Optional, Tuple
+import httpx
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+import metrics
+from repositories.base import Repository
+
+# Max Supabase calls in flight per worker; extra callers wait (without blocking the loop)
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "100"))
+# Exponential backoff with full jitter: sleep uniform(0, min(max, base * 2^attempt))
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", "0.25"))
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", "4"))
+
+# HTTP connection pool of this worker's client (one pool shared by every query)
+DB_POOL_MAX_CONNECTIONS = int(os.getenv("DB_POOL_MAX_CONNECTIONS", str(DB_MAX_CONCURRENCY)))
+DB_POOL_MAX_KEEPALIVE = int(os.getenv("DB_POOL_MAX_KEEPALIVE", "20"))
+DB_POOL_KEEPALIVE_EXPIRY = float(os.getenv("DB_POOL_KEEPALIVE_EXPIRY", "60"))
+DB_HTTP2 = os.getenv("DB_HTTP2", "1") != "0"  # Needs the `h2` package; falls back to HTTP/1.1
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_READ_TIMEOUT = float(os.getenv("DB_READ_TIMEOUT", "30"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections opened (and hot tables touched) at startup, before the worker takes traffic
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "4"))
+WARMUP_TABLES = (("merchants", "id"), ("surveys", "id"), ("lotteries", "id"), ("response_daily_counts", "survey_id"))
+
+_db_semaphore = asyncio.Semaphore(DB_MAX_CONCURRENCY)
+
+
+def set_max_concurrency(limit: int):
+    """
+    Replaces the in-flight limit. Call before serving requests (or between benchmark runs).
+    """
+    global _db_semaphore, DB_MAX_CONCURRENCY
+    DB_MAX_CONCURRENCY = limit
+    _db_semaphore = asyncio.Semaphore(limit)
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(DB_RETRY_MAX_DELAY, DB_RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+_OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def describe_query(query_builder: Any) -> Tuple[str, str]:
+    """
+    (table, operation) of a PostgREST query builder, for metrics labels.
+    """
+    request = getattr(query_builder, "request", query_builder)
+    path = str(getattr(request, "path", "") or "")
+    target = path.split("/rest/v1/", 1)[-1].split("?", 1)[0] or "unknown"
+    if target.startswith("rpc/"):
+        return target[4:], "rpc"
+
+    operation = _OPERATIONS.get(str(getattr(request, "http_method", "")).upper(), "unknown")
+    prefer = str((getattr(request, "headers", None) or {}).get("prefer", ""))
+    if operation == "insert" and "resolution=" in prefer:
+        operation = "upsert"
+    return target, operation
+
+
+# ==========================================
+# 🛡️ Safe Execute Wrapper (Retry Logic)
+# ==========================================
+async def execute_safe(query_builder: Any, retries: int = 3):
+    """
+    Awaits a Supabase query with retry logic to handle cold starts or network blips.
+    Retries back off with jitter via asyncio.sleep, so a slow call never blocks other requests.
+    """
+    table, operation = describe_query(query_builder)
+    started = time.perf_counter()
+    last_exception = None
+    try:
+        for i in range(retries):
+            try:
+                async with _db_semaphore:
+                    response = await query_builder.execute()
+                data = getattr(response, "data", None)
+                metrics.db_query_rows.inc(table, operation, amount=len(data) if isinstance(data, list) else 0)
+                return response
+            except Exception as e:
+                print(f"⚠️ DB Query failed (Attempt {i + 1}/{retries}): {e}")
+                last_exception = e
+                if i < retries - 1:
+                    metrics.db_query_retries.inc(table, operation)
+                    await asyncio.sleep(backoff_delay(i))
+        # If all retries fail, raise the last exception
+        metrics.db_query_failures.inc(table, operation)
+        raise last_exception
+    finally:
+        metrics.db_query_duration.observe(table, operation, value=time.perf_counter() - started)
+
+
+def build_http_client() -> httpx.AsyncClient:
+    http2 = DB_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=DB_POOL_MAX_CONNECTIONS,
+                            max_keepalive_connections=DB_POOL_MAX_KEEPALIVE,
+                            keepalive_expiry=DB_POOL_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(DB_READ_TIMEOUT, connect=DB_CONNECT_TIMEOUT, pool=DB_POOL_TIMEOUT)
+    )
+
+
+def _first(response):
+    return response.data[0] if response.data else None
+
+
+class SupabaseRepository(Repository):
+
+    def __init__(self, client: AsyncClient, http: Optional[httpx.AsyncClient] = None):
+        self.client = client
+        self.http = http
+
+    @classmethod
+    async def connect(cls, url: str, key: str) -> "SupabaseRepository":
+        # The async client needs a running event loop, so it cannot be created at import time.
+        # Table queries go through our pooled httpx client instead of the library default.
+        http = build_http_client()
+        client = await acreate_client(url, key, options=AsyncClientOptions(httpx_client=http))
+        return cls(client, http)
+
+    async def warm_up(self):
+        # TLS handshakes and PostgREST's schema cache are paid here instead of by the first requests
+        queries = [self.client.table(table).select(column).limit(1) for table, column in WARMUP_TABLES]
+        queries += [self.client.table('merchants').select("id").limit(1)
+                    for _ in range(max(0, DB_WARMUP_CONNECTIONS - len(queries)))]
+        results = await asyncio.gather(*(execute_safe(q, retries=1) for q in queries), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            print(f"⚠️ DB warm-up: {len(failed)}/{len(queries)} queries failed ({failed[0]})")
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.aclose()
+
+    # --- Merchants ---
+    async def get_merchant(self, merchant_id: str):
+        return _first(await execute_safe(self.client.table('merchants').select("*").eq('id', merchant_id)))
+
+    async def get_merchant_by_username(self, username: str):
+        return _first(await execute_safe(self.client.table('merchants').select("*").eq('username', username)))
+
+    async def username_taken(self, username: str, exclude_id: Optional[str] = None) -> bool:
+        query = self.client.table('merchants').select('id').eq('username', username)
+        if exclude_id:
+            query = query.neq('id', exclude_id)
+        return bool((await execute_safe(query)).data)
+
+    async def existing_usernames(self, usernames: List[str]):
+        if not usernames:
+            return set()
+        response = await execute_safe(self.client.table('merchants').select('username').in_('username', usernames))
+        return {row['username'] for row in response.data}
+
+    async def list_merchants(self, owner_id: Optional[str] = None):
+        query = self.client.table('merchants').select("*")
+        if owner_id:
+            query = query.eq('owner_id', owner_id)
+        return (await execute_safe(query)).data
+
+    async def count_merchants(self, role: str) -> int:
+        response = await execute_safe(self.client.table('merchants').select("id", count='exact').eq('role', role))
+        return response.count
+
+    async def insert_merchant(self, data: dict):
+        return (await execute_safe(self.client.table('merchants').insert(data))).data[0]
+
+    async def insert_merchants(self, rows: List[dict]):
+        if not rows:
+            return []
+        return (await execute_safe(self.client.table('merchants').insert(rows))).data
+
+    async def update_merchant(self, merchant_id: str, data: dict):
+        return _first(await execute_safe(self.client.table('merchants').update(data).eq('id', merchant_id)))
+
+    async def delete_merchant(self, merchant_id: str):
+        return _first(await execute_safe(self.client.table('merchants').delete().eq('id', merchant_id)))
+
+    # --- Surveys ---
+    async def get_survey(self, survey_id: str):
+        return _first(await execute_safe(self.client.table('surveys').select("*").eq('id', survey_id)))
+
+    async def list_surveys(self, merchant_ids: Optional[List[str]] = None):
+        query = self.client.table('surveys').select("*")
+        if merchant_ids is not None:
+            query = query.eq('merchant_id', merchant_ids[0]) if len(merchant_ids) == 1 \
+                else query.in_('merchant_id', merchant_ids)
+        return (await execute_safe(query.order('created_at', desc=True))).data
+
+    async def list_survey_ids(self):
+        response = await execute_safe(self.client.table('surveys').select("id"))
+        return [s['id'] for s in response.data]
+
+    async def insert_survey(self, data: dict):
+        return (await execute_safe(self.client.table('surveys').insert(data))).data[0]
+
+    async def insert_surveys(self, rows: List[dict]):
+        if not rows:
+            return []
+        return (await execute_safe(self.client.table('surveys').insert(rows))).data
+
+    async def update_survey(self, survey_id: str, data: dict):
+        return _first(await execute_safe(self.client.table('surveys').update(data).eq('id', survey_id)))
+
+    async def delete_survey(self, survey_id: str):
+        return _first(await execute_safe(self.client.table('surveys').delete().eq('id', survey_id)))
+
+    # --- Lotteries ---
+    async def get_lottery(self, lottery_id: str):
+        return _first(await execute_safe(self.client.table('lotteries').select("*").eq('id', lottery_id)))
+
+    async def list_lotteries(self, merchant_ids: Optional[List[str]] = None):
+        query = self.client.table('lotteries').select("*")
+        if merchant_ids is not None:
+            query = query.in_('merchant_id', merchant_ids)
+        return (await execute_safe(query)).data
+
+    async def insert_lottery(self, data: dict):
+        return (await execute_safe(self.client.table('lotteries').insert(data))).data[0]
+
+    async def insert_lotteries(self, rows: List[dict]):
+        if not rows:
+            return []
+        return (await execute_safe(self.client.table('lotteries').insert(rows))).data
+
+    async def update_lottery(self, lottery_id: str, data: dict):
+        return _first(await execute_safe(self.client.table('lotteries').update(data).eq('id', lottery_id)))
+
+    async def delete_lottery(self, lottery_id: str):
+        return _first(await execute_safe(self.client.table('lotteries').delete().eq('id', lottery_id)))
+
+    # --- Responses ---
+    async def insert_response(self, data: dict):
+        return (await execute_safe(self.client.table('responses').insert(data))).data[0]
+
+    async def get_response(self, response_id: str):
+        return _first(await execute_safe(self.client.table('responses').select("*").eq('id', response_id)))
+
+    async def insert_responses(self, rows: List[dict]):
+        response = await execute_safe(
+            self.client.table('responses').upsert(rows, on_conflict='id', ignore_duplicates=True))
+        return response.data
+
+    async def responses_page(self, survey_ids: Optional[List[str]], after: Optional[Tuple[str, str]],
+                             limit: int, columns: Optional[List[str]] = None):
+        query = self.client.table('responses').select(", ".join(columns) if columns else "*")
+
+        if survey_ids:
+            query = query.eq('survey_id', survey_ids[0]) if len(survey_ids) == 1 else query.in_('survey_id', survey_ids)
+
+        if after:
+            ts, last_id = after
+            query = query.or_(f'submitted_at.lt."{ts}",and(submitted_at.eq."{ts}",id.lt.{last_id})')
+
+        response = await execute_safe(query.order('submitted_at', desc=True).order('id', desc=True).limit(limit))
+        return response.data
+
+    async def count_responses(self, survey_ids: List[str]) -> int:
+        response = await execute_safe(
+            self.client.table('responses').select("id", count='exact').in_('survey_id', survey_ids))
+        return response.count
+
+    async def response_high_water(self, survey_id: str):
+        response = await execute_safe(self.client.table('responses').select("submitted_at", count='exact') \
+                                      .eq('survey_id', survey_id) \
+                                      .order('submitted_at', desc=True) \
+                                      .limit(1))
+        latest = response.data[0]['submitted_at'] if response.data else None
+        return response.count or 0, latest
+
+    # --- Daily rollups (migrations/001_response_daily_counts.sql) ---
+    async def increment_daily_count(self, survey_id: str, day: str, delta: int = 1):
+        await execute_safe(self.client.rpc('increment_response_rollup',
+                                           {"p_survey_id": survey_id, "p_day": day, "p_delta": delta}))
+
+    async def daily_counts(self, survey_ids: List[str], start_day: str, end_day: str):
+        all_rows = []
+        batch_size = 1000
+        start = 0
+
+        while True:
+            end = start + batch_size - 1
+            response = await execute_safe(self.client.table('response_daily_counts').select("survey_id, day, count") \
+                                          .in_('survey_id', survey_ids) \
+                                          .gte('day', start_day) \
+                                          .lte('day', end_day) \
+                                          .order('day') \
+                                          .order('survey_id') \
+                                          .range(start, end))
+            data = response.data
+
+            if not data:
+                break
+
+            all_rows.extend(data)
+
+            if len(data) < batch_size:
+                break
+
+            start += batch_size
+
+        return all_rows
+
+    async def replace_daily_counts(self, survey_ids: List[str], rows: List[dict]):
+        # One transaction per batch of surveys (replace_response_rollup, migrations/001): a
+        # failed call leaves that batch's old counts in place, and ids travel in the body
+        rows_by_survey = {}
+        for row in rows:
+            rows_by_survey.setdefault(row['survey_id'], []).append(row)
+        target_ids = list(dict.fromkeys(list(survey_ids) + list(rows_by_survey)))
+
+        batch_size = 200
+        for i in range(0, len(target_ids), batch_size):
+            batch_ids = target_ids[i:i + batch_size]
+            batch_rows = [row for s_id in batch_ids for row in rows_by_survey.get(s_id, [])]
+            await execute_safe(self.client.rpc('replace_response_rollup',
+                                               {"p_survey_ids": batch_ids, "p_rows": batch_rows}))
+
+    # --- AI analyses (migrations/003_ai_analyses.sql) ---
+    async def latest_analysis(self, survey_id: str, language: str):
+        return _first(await execute_safe(self.client.table('ai_analyses').select("*") \
+                                         .eq('survey_id', survey_id) \
+                                         .eq('language', language) \
+                                         .order('created_at', desc=True) \
+                                         .limit(1)))
+
+    async def insert_analysis(self, data: dict):
+        return (await execute_safe(self.client.table('ai_analyses').insert(data))).data[0]
+
+    # --- Background jobs (migrations/004_background_jobs.sql) ---
+    async def upsert_job(self, data: dict):
+        await execute_safe(self.client.table('background_jobs').upsert(data))
+
+    async def get_job(self, job_id: str):
+        return _first(await execute_safe(self.client.table('background_jobs').select("*").eq('id', job_id)))
+
+    # --- Write counters (migrations/006_entity_versions.sql) ---
+    async def get_versions(self):
+        response = await execute_safe(self.client.table('entity_versions').select("name, version"))
+        return {r['name']: r['version'] for r in response.data}
@@ -1,232 +1,328 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional
 from datetime import datetime, timedelta, date
 import traceback
-from collections import defaultdict
 import calendar
 import schemas
 import database
-from services import ai_service
+import session
+from services import ai_service, analytics_service, job_service, rollup_service
+from services.query_plan import QueryPlan
 
 router = APIRouter(prefix="/api/analytics", tags=["Analytics"])
 
+ANALYSIS_JOB = "analysis"
+job_service.register_kind(ANALYSIS_JOB, ai_service.AI_JOB_CONCURRENCY)
 
-@router.get("/dashboard-stats", response_model=schemas.DashboardStats)
-def get_dashboard_stats(merchant_id: str, filter_merchant_id: Optional[str] = None):
-    try:
-        merchant = database.get_merchant_by_id(merchant_id)
-        if not merchant:
-            raise HTTPException(status_code=404, detail="Merchant not found")
-
-        isAdmin = merchant.get('username') == 'admin'
-
-        # 1. Determine Scope for Totals (Overview Section)
-        if isAdmin:
-            account_survey_ids = database.get_all_survey_ids()
-            all_m = database.get_all_merchants()
-            total_restaurants = len(all_m)
-            total_owners = database.get_owner_count()
-        elif merchant.get('role') == 'owner':
-            account_survey_ids = database.get_survey_ids_by_merchant(merchant_id)
-            subs = database.get_merchants_by_owner(merchant_id)
-            total_restaurants = len(subs)
-            total_owners = None
-        else:
-            # Manager
-            account_survey_ids = database.get_survey_ids_by_merchant(merchant_id)
-            total_restaurants = 1
-            total_owners = None
 
-        total_surveys = len(account_survey_ids)
-        total_responses = database.count_responses_by_surveys(account_survey_ids)
+def is_admin(merchant: dict) -> bool:
+    return merchant.get('username') == 'admin'
+
+
+async def resolve_account_survey_ids(merchant: dict):
+    if is_admin(merchant):
+        return await database.get_all_survey_ids()
+    return await database.get_survey_ids_by_merchant(merchant['id'], merchant)
 
-        # 2. Determine Scope for Today's Stats
-        if filter_merchant_id:
-            filtered_survey_ids = database.get_survey_ids_by_merchant(filter_merchant_id)
-        else:
-            filtered_survey_ids = account_survey_ids
 
-        # 3. Get Timestamps
-        timestamps = database.get_response_timestamps(filtered_survey_ids)
+def growth_pct(current: int, previous: int) -> float:
+    if previous == 0:
+        return float(current * 100) if current > 0 else 0.0
+    return round(((current - previous) / previous) * 100, 1)
 
+
+def period_bounds(view_mode: str, target_date: Optional[str], now: datetime):
+    """
+    Returns (chart_start, chart_end, prev_start, prev_end) for a 'month' ('YYYY-MM') or 'year' ('YYYY') view.
+    """
+    if view_mode == 'month':
+        if target_date:
+            parts = target_date.split('-')
+            selected_year = int(parts[0])
+            selected_month = int(parts[1])
+        else:
+            selected_year = now.year
+            selected_month = now.month
+
+        _, num_days = calendar.monthrange(selected_year, selected_month)
+        chart_start_date = date(selected_year, selected_month, 1)
+        chart_end_date = date(selected_year, selected_month, num_days)
+
+        prev_month_end = chart_start_date - timedelta(days=1)
+        return chart_start_date, chart_end_date, prev_month_end.replace(day=1), prev_month_end
+
+    # Year Mode
+    selected_year = int(target_date) if target_date else now.year
+    return (date(selected_year, 1, 1), date(selected_year, 12, 31),
+            date(selected_year - 1, 1, 1), date(selected_year - 1, 12, 31))
+
+
+def build_today_data(daily: dict, today_date: date) -> dict:
+    yesterday_date = today_date - timedelta(days=1)
+    today_count = daily.get(today_date, 0)
+    yesterday_count = daily.get(yesterday_date, 0)
+    return {
+        "today_count": today_count,
+        "yesterday_count": yesterday_count,
+        "diff": today_count - yesterday_count,
+        "growth_pct": growth_pct(today_count, yesterday_count)
+    }
+
+
+def build_trends(daily: dict, view_mode: str, bounds: tuple) -> dict:
+    """
+    Period totals and chart points from {date: count} rollup buckets covering `bounds`.
+    """
+    chart_start_date, chart_end_date, prev_period_start, prev_period_end = bounds
+
+    current_period_count = 0
+    prev_period_count = 0
+    chart_map = {}
+
+    for d, count in daily.items():
+        if d >= chart_start_date and d <= chart_end_date:
+            current_period_count += count
+            key = str(d.day) if view_mode == 'month' else str(d.month)
+            chart_map[key] = chart_map.get(key, 0) + count
+        elif d >= prev_period_start and d <= prev_period_end:
+            prev_period_count += count
+
+    # Fill Missing Chart Data
+    chart_data = []
+    if view_mode == 'month':
+        days_in_month = (chart_end_date - chart_start_date).days + 1
+        for day in range(1, days_in_month + 1):
+            full_date_obj = date(chart_start_date.year, chart_start_date.month, day)
+            chart_data.append({
+                "label": f"{day}日",
+                "value": chart_map.get(str(day), 0),
+                "full_date": full_date_obj.strftime("%Y-%m-%d")
+            })
+    else:
+        for m in range(1, 13):
+            chart_data.append({
+                "label": f"{m}月",
+                "value": chart_map.get(str(m), 0),
+                "full_date": f"{chart_start_date.year}-{m}"
+            })
+
+    return {
+        "stats": {
+            "today_count": 0,
+            "yesterday_count": 0,
+            "daily_growth_pct": 0,
+            "month_count": current_period_count,
+            "last_month_count": prev_period_count,
+            "monthly_growth_pct": growth_pct(current_period_count, prev_period_count)
+        },
+        "chart_data": chart_data
+    }
+
+
+def parse_periods(periods: Optional[List[str]]) -> List[tuple]:
+    """
+    'month', 'month:YYYY-MM', 'year' or 'year:YYYY' -> [(view_mode, target_date)].
+    """
+    parsed = []
+    for p in periods or ['month']:
+        view_mode, _, target_date = p.partition(':')
+        if view_mode not in ('month', 'year'):
+            raise HTTPException(status_code=400, detail=f"Invalid period: {p}")
+        parsed.append((view_mode, target_date or None))
+    return parsed
+
+
+def add_scope_stages(plan: QueryPlan, merchant: dict, filter_merchant_id: Optional[str]):
+    """
+    Adds "survey_ids" (the whole account of the requesting merchant) and "scope_ids"
+    (narrowed to the store filter for admins/owners) to the plan. The filter's surveys
+    are fetched alongside the account's.
+    """
+    narrow = bool(filter_merchant_id) and (is_admin(merchant) or merchant.get('role') == 'owner')
+
+    async def resolve_scope(survey_ids, filtered_ids=None):
+        return filtered_ids if narrow else survey_ids
+
+    plan.add("survey_ids", lambda: resolve_account_survey_ids(merchant))
+    if narrow:
+        plan.add("filtered_ids", lambda: database.get_survey_ids_by_merchant(filter_merchant_id))
+        plan.add("scope_ids", resolve_scope, "survey_ids", "filtered_ids")
+    else:
+        plan.add("scope_ids", resolve_scope, "survey_ids")
+
+
+def add_total_stages(plan: QueryPlan, merchant: dict):
+    async def count_restaurants():
+        if is_admin(merchant):
+            return len(await database.get_all_merchants())
+        if merchant.get('role') == 'owner':
+            return len(await database.get_merchants_by_owner(merchant['id']))
+        return 1  # Manager
+
+    async def count_owners():
+        return await database.get_owner_count() if is_admin(merchant) else None
+
+    plan.add("restaurants", count_restaurants)
+    plan.add("owners", count_owners)
+    plan.add("total_responses", database.count_responses_by_surveys, "survey_ids")
+
+
+def build_stats(results: dict, today_date: date) -> dict:
+    return {
+        "total_restaurants": results["restaurants"],
+        "total_surveys": len(results["survey_ids"]),
+        "total_responses": results["total_responses"],
+        "total_owners": results["owners"],
+        "today_data": build_today_data(results["daily"], today_date)
+    }
+
+
+@router.get("/dashboard", response_model=schemas.Dashboard)
+async def get_dashboard(
+        response: Response,
+        merchant: dict = Depends(session.current_merchant),
+        filter_merchant_id: Optional[str] = None,
+        periods: Optional[List[str]] = Query(None)  # e.g. ?periods=month:2024-05&periods=year:2024
+):
+    """
+    Overview cards, today vs yesterday and one or more trend periods in a single call:
+    the scope is resolved once and one rollup read covers every requested range.
+    """
+    try:
         now = datetime.now()
         today_date = now.date()
-        yesterday_date = today_date - timedelta(days=1)
+        requested = [(view_mode, target_date, period_bounds(view_mode, target_date, now))
+                     for view_mode, target_date in parse_periods(periods)]
 
-        today_count = 0
-        yesterday_count = 0
+        start_day = min([today_date - timedelta(days=1)] + [b[2] for _, _, b in requested])
+        end_day = max([today_date] + [b[1] for _, _, b in requested])
 
-        for ts_str in timestamps:
-            dt = datetime.fromisoformat(ts_str)
-            d = dt.date()
-            if d == today_date:
-                today_count += 1
-            elif d == yesterday_date:
-                yesterday_count += 1
+        async def read_daily(scope_ids):
+            return await rollup_service.get_daily_totals(scope_ids, start_day, end_day)
 
-        diff = today_count - yesterday_count
+        plan = QueryPlan()
+        add_scope_stages(plan, merchant, filter_merchant_id)
+        add_total_stages(plan, merchant)
+        plan.add("daily", read_daily, "scope_ids")
 
-        if yesterday_count == 0:
-            growth_pct = float(today_count * 100) if today_count > 0 else 0.0
-        else:
-            growth_pct = round((diff / yesterday_count) * 100, 1)
+        results = await plan.run()
+        response.headers["Server-Timing"] = plan.server_timing()
 
         return {
-            "total_restaurants": total_restaurants,
-            "total_surveys": total_surveys,
-            "total_responses": total_responses,
-            "total_owners": total_owners,
-            "today_data": {
-                "today_count": today_count,
-                "yesterday_count": yesterday_count,
-                "diff": diff,
-                "growth_pct": growth_pct
-            }
+            "stats": build_stats(results, today_date),
+            "periods": [
+                {"view_mode": view_mode, "target_date": target_date,
+                 **build_trends(results["daily"], view_mode, bounds)}
+                for view_mode, target_date, bounds in requested
+            ]
         }
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/dashboard-stats", response_model=schemas.DashboardStats)
+async def get_dashboard_stats(response: Response, merchant: dict = Depends(session.current_merchant),
+                              filter_merchant_id: Optional[str] = None):
+    try:
+        today_date = datetime.now().date()
+
+        async def read_daily(scope_ids):
+            # Today's stats follow the store filter when one is set
+            return await rollup_service.get_daily_totals(scope_ids, today_date - timedelta(days=1), today_date)
+
+        plan = QueryPlan()
+        add_scope_stages(plan, merchant, filter_merchant_id)
+        add_total_stages(plan, merchant)
+        plan.add("daily", read_daily, "scope_ids")
+
+        results = await plan.run()
+        response.headers["Server-Timing"] = plan.server_timing()
+
+        return build_stats(results, today_date)
+
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/trends", response_model=schemas.DashboardTrends)
-def get_dashboard_trends(
-        merchant_id: str,
+async def get_dashboard_trends(
+        response: Response,
+        merchant: dict = Depends(session.current_merchant),
         filter_merchant_id: Optional[str] = None,
         view_mode: str = 'month',  # 'month' or 'year'
         target_date: Optional[str] = None  # 'YYYY-MM' or 'YYYY'
 ):
     try:
-        # 1. Determine Scope
-        merchant = database.get_merchant_by_id(merchant_id)
-        if not merchant:
-            raise HTTPException(status_code=404, detail="Merchant not found")
-        isAdmin = merchant.get('username') == 'admin'
-
-        target_merchant_id = merchant_id
-        if (isAdmin or merchant.get('role') == 'owner') and filter_merchant_id:
-            target_merchant_id = filter_merchant_id
-            survey_ids = database.get_survey_ids_by_merchant(target_merchant_id)
-        else:
-            if isAdmin:
-                survey_ids = database.get_all_survey_ids()
-            else:
-                survey_ids = database.get_survey_ids_by_merchant(merchant_id)
+        bounds = period_bounds(view_mode, target_date, datetime.now())
 
-        # 2. Fetch Timestamps
-        timestamps = database.get_response_timestamps(survey_ids)
+        async def read_daily(scope_ids):
+            return await rollup_service.get_daily_totals(scope_ids, bounds[2], bounds[1])
 
-        # 3. Process Dates
-        now = datetime.now()
-        chart_start_date = None
-        chart_end_date = None
-        prev_period_start = None
-        prev_period_end = None
-
-        if view_mode == 'month':
-            if target_date:
-                parts = target_date.split('-')
-                selected_year = int(parts[0])
-                selected_month = int(parts[1])
-            else:
-                selected_year = now.year
-                selected_month = now.month
-
-            _, num_days = calendar.monthrange(selected_year, selected_month)
-            chart_start_date = date(selected_year, selected_month, 1)
-            chart_end_date = date(selected_year, selected_month, num_days)
-
-            prev_month_end = chart_start_date - timedelta(days=1)
-            prev_period_start = prev_month_end.replace(day=1)
-            prev_period_end = prev_month_end
+        plan = QueryPlan()
+        add_scope_stages(plan, merchant, filter_merchant_id)
+        plan.add("daily", read_daily, "scope_ids")
 
-        else:
-            # Year Mode
-            if target_date:
-                selected_year = int(target_date)
-            else:
-                selected_year = now.year
-
-            chart_start_date = date(selected_year, 1, 1)
-            chart_end_date = date(selected_year, 12, 31)
-
-            prev_period_start = date(selected_year - 1, 1, 1)
-            prev_period_end = date(selected_year - 1, 12, 31)
-
-        # 4. Aggregation
-        current_period_count = 0
-        prev_period_count = 0
-        chart_map = defaultdict(int)
-
-        for ts_str in timestamps:
-            dt = datetime.fromisoformat(ts_str)
-            d = dt.date()
-
-            if d >= chart_start_date and d <= chart_end_date:
-                current_period_count += 1
-                if view_mode == 'month':
-                    chart_map[str(d.day)] += 1
-                else:
-                    chart_map[str(d.month)] += 1
-            elif d >= prev_period_start and d <= prev_period_end:
-                prev_period_count += 1
-
-        # 5. Fill Missing Chart Data
-        chart_data = []
-        if view_mode == 'month':
-            days_in_month = (chart_end_date - chart_start_date).days + 1
-            for day in range(1, days_in_month + 1):
-                key = str(day)
-                val = chart_map.get(key, 0)
-                try:
-                    full_date_obj = date(chart_start_date.year, chart_start_date.month, day)
-                    full_date_str = full_date_obj.strftime("%Y-%m-%d")
-                    chart_data.append({
-                        "label": f"{day}日",
-                        "value": val,
-                        "full_date": full_date_str
-                    })
-                except ValueError:
-                    continue
-        else:
-            for m in range(1, 13):
-                key = str(m)
-                val = chart_map.get(key, 0)
-                chart_data.append({
-                    "label": f"{m}月",
-                    "value": val,
-                    "full_date": f"{chart_start_date.year}-{m}"
-                })
-
-        # 6. Calc Growth
-        def calc_growth(current, previous):
-            if previous == 0:
-                if current == 0: return 0.0
-                return float(current * 100)
-            diff = current - previous
-            return round((diff / previous) * 100, 1)
-
-        period_growth = calc_growth(current_period_count, prev_period_count)
+        results = await plan.run()
+        response.headers["Server-Timing"] = plan.server_timing()
+
+        return build_trends(results["daily"], view_mode, bounds)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {
-            "stats": {
-                "today_count": 0,
-                "yesterday_count": 0,
-                "daily_growth_pct": 0,
-                "month_count": current_period_count,
-                "last_month_count": prev_period_count,
-                "monthly_growth_pct": period_growth
-            },
-            "chart_data": chart_data
-        }
 
+@router.get("/survey-summary", response_model=schemas.SurveySummary)
+async def get_survey_summary(survey_id: str, text_limit: int = Query(analytics_service.DEFAULT_TEXT_LIMIT, ge=0, le=500)):
+    try:
+        return await analytics_service.summarize_survey(survey_id, text_limit)
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/analyze")
-def analyze_survey_with_ai(survey_id: str = Query(...), language: str = Query("en")):
+@router.post("/analyze", response_model=schemas.AnalysisResult)
+async def analyze_survey_with_ai(
+        survey_id: str = Query(...),
+        language: str = Query("en"),
+        max_new_responses: int = Query(0, ge=0, description="Reuse the last report if at most this many new responses came in"),
+        force: bool = False
+):
     # Call the Service Layer
-    result_text = ai_service.analyze_survey(survey_id, language)
-    return {"analysis": result_text}
+    return await ai_service.analyze_survey(survey_id, language, max_new_responses, force)
+
+
+@router.post("/analyze/jobs", response_model=schemas.JobStatus)
+async def submit_analysis_job(
+        survey_id: str = Query(...),
+        language: str = Query("en"),
+        max_new_responses: int = Query(0, ge=0),
+        force: bool = False
+):
+    # Same request while one is queued/running -> same job
+    dedup_key = f"{ANALYSIS_JOB}:{survey_id}:{language}:{max_new_responses}:{force}"
+    params = {"survey_id": survey_id, "language": language, "max_new_responses": max_new_responses, "force": force}
+
+    async def run(job: dict):
+        return await ai_service.analyze_survey(survey_id, language, max_new_responses, force)
+
+    return await job_service.submit(ANALYSIS_JOB, run, params, dedup_key=dedup_key)
+
+
+@router.get("/analyze/jobs/{job_id}", response_model=schemas.JobStatus)
+async def get_analysis_job(job_id: str):
+    job = await job_service.get(job_id)
+    if not job or job["kind"] != ANALYSIS_JOB:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -3,12 +3,13 @@ import uuid
 import traceback
 import schemas
 import database
+import session
 
 router = APIRouter(prefix="/api/auth", tags=["Auth"])
 
 
 @router.post("/register", response_model=schemas.Merchant)
-def register(merchant: schemas.MerchantRegister):
+async def register(merchant: schemas.MerchantRegister):
     try:
         new_data = {
             "id": str(uuid.uuid4()),
@@ -18,7 +19,7 @@ def register(merchant: schemas.MerchantRegister):
             "role": merchant.role,
             "owner_id": str(merchant.owner_id) if merchant.owner_id else None
         }
-        return database.register_merchant(new_data)
+        return await database.register_merchant(new_data)
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
@@ -26,13 +27,14 @@ def register(merchant: schemas.MerchantRegister):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/login", response_model=schemas.Merchant)
-def login(creds: schemas.MerchantLogin):
-    user = database.login_merchant(creds.username)
+@router.post("/login", response_model=schemas.LoginResult)
+async def login(creds: schemas.MerchantLogin):
+    user = await database.login_merchant(creds.username)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     if user['password'] != creds.password:
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
-    return user
+    token, expires_at = session.issue_token(user)
+    return {**user, "token": token, "token_expires_at": expires_at}
@@ -0,0 +1,87 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional
+from datetime import datetime
+import os
+import tempfile
+import schemas
+from services import export_service, job_service
+
+router = APIRouter(prefix="/api/exports", tags=["Exports"])
+
+FORMAT_PATTERN = "^(csv|parquet)$"
+EXPORT_JOB = "export"
+
+job_service.register_kind(EXPORT_JOB, job_service.JOB_MAX_CONCURRENCY, cleanup=export_service.remove_expired)
+
+
+def export_filename(fmt: str) -> str:
+    return f"responses-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+
+
+@router.get("/responses")
+async def export_responses(
+        format: str = Query("csv", pattern=FORMAT_PATTERN),
+        survey_id: Optional[str] = None,
+        merchant_id: Optional[str] = None,  # one store
+        owner_id: Optional[str] = None  # an owner and all of its stores
+):
+    surveys = await export_service.resolve_surveys(survey_id, merchant_id, owner_id)
+    headers = {"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+
+    if format == "csv":
+        return StreamingResponse(export_service.iter_csv(surveys), media_type="text/csv; charset=utf-8",
+                                 headers=headers)
+
+    # Parquet needs a seekable file: spool to a temp file, remove it after sending
+    fd, path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        await export_service.write_parquet(surveys, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return FileResponse(path, media_type="application/vnd.apache.parquet", headers=headers,
+                        background=BackgroundTask(os.remove, path))
+
+
+@router.post("/responses/jobs", response_model=schemas.JobStatus)
+async def create_export_job(
+        format: str = Query("csv", pattern=FORMAT_PATTERN),
+        survey_id: Optional[str] = None,
+        merchant_id: Optional[str] = None,
+        owner_id: Optional[str] = None
+):
+    # Validate the scope up front so bad requests fail fast instead of as a failed job
+    surveys = await export_service.resolve_surveys(survey_id, merchant_id, owner_id)
+
+    async def run(job: dict):
+        path = export_service.export_path(job["id"], format)
+        return await export_service.write_export(surveys, format, path)
+
+    params = {"format": format, "survey_id": survey_id, "merchant_id": merchant_id, "owner_id": owner_id}
+    return await job_service.submit(EXPORT_JOB, run, params)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobStatus)
+async def get_export_job(job_id: str):
+    job = await job_service.get(job_id)
+    if not job or job["kind"] != EXPORT_JOB:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export(job_id: str):
+    job = await job_service.get(job_id)
+    if not job or job["kind"] != EXPORT_JOB:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Export is {job['status']}")
+
+    result = job["result"]
+    if not os.path.isfile(result["path"]):
+        # Expired (EXPORT_TTL), or written to another instance's local EXPORT_DIR
+        raise HTTPException(status_code=404, detail="Export file is no longer available, start a new export")
+    return FileResponse(result["path"], filename=export_filename(result["format"]))
@@ -1,15 +1,18 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import List, Optional
 import uuid
 import traceback
 import schemas
 import database
+import etags
+import session
+from services import lottery_service
 
 router = APIRouter(prefix="/api/lotteries", tags=["Lotteries"])
 
 
 @router.post("/", response_model=schemas.Lottery)
-def create_lottery(lottery: schemas.LotteryCreate):
+async def create_lottery(lottery: schemas.LotteryCreate):
     try:
         new_id = str(uuid.uuid4())
         prizes_data = []
@@ -26,14 +29,14 @@ def create_lottery(lottery: schemas.LotteryCreate):
             "name": lottery.name,
             "prizes": prizes_data
         }
-        return database.insert_lottery(new_lottery_data)
+        return await database.insert_lottery(new_lottery_data)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.put("/{lottery_id}", response_model=schemas.Lottery)
-def update_lottery(lottery_id: str, lottery: schemas.LotteryCreate):
+async def update_lottery(lottery_id: str, lottery: schemas.LotteryCreate):
     try:
         prizes_data = []
         for p in lottery.prizes:
@@ -47,16 +50,19 @@ def update_lottery(lottery_id: str, lottery: schemas.LotteryCreate):
             "name": lottery.name,
             "prizes": prizes_data
         }
-        return database.update_lottery(lottery_id, update_data)
+        result = await database.update_lottery(lottery_id, update_data)
+        lottery_service.invalidate_lottery(lottery_id)
+        return result
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/{lottery_id}")
-def delete_lottery(lottery_id: str):
+async def delete_lottery(lottery_id: str):
     try:
-        database.delete_lottery(lottery_id)
+        await database.delete_lottery(lottery_id)
+        lottery_service.invalidate_lottery(lottery_id)
         return {"message": "Lottery deleted successfully"}
     except Exception as e:
         traceback.print_exc()
@@ -64,15 +70,22 @@ def delete_lottery(lottery_id: str):
 
 
 @router.get("/", response_model=List[schemas.Lottery])
-def get_lotteries(merchant_id: str = Query(..., description="Merchant ID is required")):
+async def get_lotteries(response: Response, requesting_merchant: Optional[dict] = Depends(session.viewed_merchant),
+                        if_none_match: Optional[str] = Header(None)):
+    if not requesting_merchant:
+        return []  # Unknown merchant (e.g. a stale QR code): nothing to list
+    # Unchanged since the client's copy: answered with one version read, no listing query
+    tag = await etags.make(("lotteries", "merchants"), requesting_merchant['id'])
+    if etags.matches(if_none_match, tag):
+        return etags.not_modified(tag)
+    etags.tag_response(response, tag)
     try:
-        requesting_merchant = database.get_merchant_by_id(merchant_id)
         # Admin check
-        if requesting_merchant and requesting_merchant.get('username') == 'admin':
-            return database.get_all_lotteries_admin()
+        if requesting_merchant.get('username') == 'admin':
+            return await database.get_all_lotteries_admin()
 
         # Hierarchy check happens inside get_lotteries_by_merchant now
-        return database.get_lotteries_by_merchant(merchant_id)
+        return await database.get_lotteries_by_merchant(requesting_merchant['id'], requesting_merchant)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,41 +1,102 @@
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from datetime import datetime
+import base64
+import json
 import uuid
 import traceback
 import schemas
 import database
-from services import lottery_service
+from services import admission_service, submission_service
 
 router = APIRouter(prefix="/api/responses", tags=["Responses"])
 
+# uuid5 namespace for Idempotency-Key headers that are not UUIDs themselves
+IDEMPOTENCY_NAMESPACE = uuid.UUID("6f1d3c52-2b7e-4c3a-9a51-0d8e5b7c2f44")
+
 @router.post("/", response_model=schemas.LotteryResult)
-def submit_response(response: schemas.SurveyResponseCreate):
+async def submit_response(response: schemas.SurveyResponseCreate, background_tasks: BackgroundTasks,
+                          idempotency_key: Optional[str] = Header(None)):
+    new_id = response_id(idempotency_key, response.id)
+    # A retry of a stored submission is answered before rate limits can reject it
+    known = submission_service.known_result(str(response.survey_id), new_id)
+    if known is not None:
+        return known
+    # Shed excess load before any datastore work (429 / 503 with Retry-After)
+    admission_service.check_rate(str(response.customer_id), str(response.survey_id))
     try:
         new_response_data = {
-            "id": str(uuid.uuid4()),
+            "id": new_id,
             "survey_id": str(response.survey_id),
             "customer_id": str(response.customer_id),
             "answers": response.answers,
             "submitted_at": datetime.now().isoformat()
         }
-        database.insert_response(new_response_data)
-
-        current_survey = database.get_survey_by_id(str(response.survey_id))
-        if current_survey and current_survey.get("lottery_id"):
-            lottery_id = current_survey["lottery_id"]
-            # Use Service
-            won_prize = lottery_service.run_lottery_algorithm(lottery_id)
-            if won_prize:
-                return {"won": True, "prize": won_prize, "message": f"恭喜！你获得了 {won_prize['name']}"}
-            else:
-                return {"won": False, "prize": None, "message": "很遗憾，这次没有中奖。"}
-        return {"won": False, "prize": None, "message": "感谢您的反馈！"}
+        # Retries with the same id get the original lottery result without a second write
+        async with admission_service.submit_slot():
+            return await submission_service.submit(new_response_data, background_tasks)
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def response_id(idempotency_key: Optional[str], body_id: Optional[uuid.UUID]) -> str:
+    """
+    The stored response id: the client's idempotency key (header, else body `id`), or a
+    fresh one. Non-UUID header keys are mapped to a stable UUID.
+    """
+    if idempotency_key:
+        try:
+            return str(uuid.UUID(idempotency_key))
+        except ValueError:
+            return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, idempotency_key))
+    return str(body_id) if body_id else str(uuid.uuid4())
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row['submitted_at'], row['id']]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        ts, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        # Both parts end up in a PostgREST filter, so only accept well-formed values
+        datetime.fromisoformat(str(ts))
+        return str(ts), str(uuid.UUID(str(last_id)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def stream_ndjson(survey_id: Optional[str]):
+    # One keyset page in memory at a time, whatever the survey size
+    async for page in database.iter_responses([survey_id] if survey_id else None):
+        yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in page)
+
+
 @router.get("/")
-def get_responses(survey_id: Optional[str] = None):
-    return database.get_responses(survey_id)
+async def get_responses(survey_id: Optional[str] = None, stream: bool = False):
+    if stream:
+        return StreamingResponse(stream_ndjson(survey_id), media_type="application/x-ndjson")
+    return await database.get_responses(survey_id)
+
+
+@router.get("/page", response_model=schemas.ResponsePage)
+async def get_responses_page(
+        survey_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(500, ge=1, le=1000)
+):
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        items = await database.get_responses_page([survey_id] if survey_id else None, after, limit)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    next_cursor = encode_cursor(items[-1]) if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
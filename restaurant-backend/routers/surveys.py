@@ -1,16 +1,19 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import List, Optional
 from datetime import datetime
 import uuid
 import traceback
 import schemas
 import database
+import etags
+import session
+from services import lottery_service, onboarding_service
 
 router = APIRouter(prefix="/api/surveys", tags=["Surveys"])
 
 
 @router.post("/", response_model=schemas.Survey)
-def create_survey(survey: schemas.SurveyCreate):
+async def create_survey(survey: schemas.SurveyCreate):
     try:
         new_id = str(uuid.uuid4())
         questions_data = []
@@ -33,14 +36,33 @@ def create_survey(survey: schemas.SurveyCreate):
             "questions": questions_data
         }
 
-        return database.insert_survey(new_survey_data)
+        return await database.insert_survey(new_survey_data)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
 
 
+@router.post("/propagate", response_model=schemas.PropagateResult)
+async def propagate_survey(request: schemas.PropagateRequest):
+    """
+    Copies a template survey and/or lottery into every (or the listed) store of an owner,
+    written with batched inserts. Returns the new ids per store.
+    """
+    try:
+        return await onboarding_service.propagate_templates(
+            str(request.template_survey_id) if request.template_survey_id else None,
+            str(request.template_lottery_id) if request.template_lottery_id else None,
+            str(request.owner_id) if request.owner_id else None,
+            [str(s) for s in request.store_ids] if request.store_ids is not None else None)
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.put("/{survey_id}", response_model=schemas.Survey)
-def update_survey(survey_id: str, survey: schemas.SurveyCreate):
+async def update_survey(survey_id: str, survey: schemas.SurveyCreate):
     try:
         questions_data = []
         for q in survey.questions:
@@ -62,16 +84,19 @@ def update_survey(survey_id: str, survey: schemas.SurveyCreate):
             "merchant_id": str(survey.merchant_id)
         }
 
-        return database.update_survey(survey_id, update_data)
+        result = await database.update_survey(survey_id, update_data)
+        lottery_service.invalidate_survey(survey_id)
+        return result
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/{survey_id}")
-def delete_survey(survey_id: str):
+async def delete_survey(survey_id: str):
     try:
-        database.delete_survey(survey_id)
+        await database.delete_survey(survey_id)
+        lottery_service.invalidate_survey(survey_id)
         return {"message": "Survey deleted successfully"}
     except Exception as e:
         traceback.print_exc()
@@ -79,12 +104,19 @@ def delete_survey(survey_id: str):
 
 
 @router.get("/", response_model=List[schemas.Survey])
-def get_surveys(merchant_id: str = Query(..., description="Merchant ID is required")):
+async def get_surveys(response: Response, requesting_merchant: Optional[dict] = Depends(session.viewed_merchant),
+                      if_none_match: Optional[str] = Header(None)):
+    if not requesting_merchant:
+        return []  # Unknown merchant (e.g. a stale QR code): nothing to list
+    # Unchanged since the client's copy: answered with one version read, no listing query
+    tag = await etags.make(("surveys", "merchants"), requesting_merchant['id'])
+    if etags.matches(if_none_match, tag):
+        return etags.not_modified(tag)
+    etags.tag_response(response, tag)
     try:
-        requesting_merchant = database.get_merchant_by_id(merchant_id)
-        if requesting_merchant and requesting_merchant.get('username') == 'admin':
-            return database.get_all_surveys_admin()
-        return database.get_surveys_by_merchant(merchant_id)
+        if requesting_merchant.get('username') == 'admin':
+            return await database.get_all_surveys_admin()
+        return await database.get_surveys_by_merchant(requesting_merchant['id'], requesting_merchant)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
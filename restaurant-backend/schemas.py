@@ -29,6 +29,44 @@ class Merchant(MerchantBase):
     class Config:
         from_attributes = True
 
+class MerchantImport(BaseModel):
+    # Raw rows (restaurant_name, username, password, role, owner_id), validated one by one
+    owner_id: Optional[UUID] = None  # Applied to rows without their own owner_id
+    merchants: List[Dict[str, Any]]
+
+class MerchantImportRow(BaseModel):
+    row: int  # 0-based position in the input
+    username: Optional[str] = None
+    status: str  # 'created', 'error'
+    id: Optional[UUID] = None
+    error: Optional[str] = None
+
+class MerchantImportResult(BaseModel):
+    created: int
+    failed: int
+    rows: List[MerchantImportRow]
+
+class PropagateRequest(BaseModel):
+    # Copies a template survey and/or lottery into stores of one owner
+    template_survey_id: Optional[UUID] = None
+    template_lottery_id: Optional[UUID] = None
+    owner_id: Optional[UUID] = None  # Defaults to the template's merchant (or its owner, for a store)
+    store_ids: Optional[List[UUID]] = None  # None = every store of the owner
+
+class PropagatedStore(BaseModel):
+    merchant_id: UUID
+    survey_id: Optional[UUID] = None
+    lottery_id: Optional[UUID] = None
+
+class PropagateResult(BaseModel):
+    stores: List[PropagatedStore]
+    skipped: List[UUID]  # Requested store ids that are not stores of the owner, or the template's own store
+
+class LoginResult(Merchant):
+    # Signed session token (send as `Authorization: Bearer <token>`); expiry is a unix timestamp
+    token: str
+    token_expires_at: int
+
 # --- 1. 奖品 (Prize) ---
 class PrizeBase(BaseModel):
     name: str
@@ -94,7 +132,8 @@ class SurveyResponseBase(BaseModel):
     answers: Dict[str, str]
 
 class SurveyResponseCreate(SurveyResponseBase):
-    pass
+    # Client-generated per submission; doubles as the idempotency key of retries
+    id: Optional[UUID] = None
 
 class SurveyResponse(SurveyResponseBase):
     id: UUID
@@ -138,3 +177,63 @@ class GrowthStats(BaseModel):
 class DashboardTrends(BaseModel):
     stats: GrowthStats
     chart_data: List[ChartPoint]
+
+class DashboardPeriod(DashboardTrends):
+    view_mode: str # 'month' or 'year'
+    target_date: Optional[str] = None
+
+class Dashboard(BaseModel):
+    stats: DashboardStats
+    periods: List[DashboardPeriod]
+
+# --- 8. 问卷统计 (Survey Summary) ---
+class OptionCount(BaseModel):
+    name: str
+    value: int
+
+class QuestionSummary(BaseModel):
+    question_id: str
+    text: str
+    type: str
+    options: List[OptionCount] = []
+    other_count: int = 0
+    other_samples: List[str] = []
+    merged_count: int = 0 # Answers recovered from old question ids
+    total_votes: int = 0
+    text_count: int = 0
+    text_samples: List[str] = []
+
+class UnlinkedSummary(BaseModel):
+    question_id: str
+    count: int
+    samples: List[str]
+
+class SurveySummary(BaseModel):
+    survey_id: str
+    total_responses: int
+    questions: List[QuestionSummary]
+    unlinked: List[UnlinkedSummary]
+
+# --- 9. 回复分页 (Response Page) ---
+class ResponsePage(BaseModel):
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None # Pass back as `cursor` to fetch the next page
+
+# --- 10. 后台任务 (Background Job) ---
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str # 'queued', 'running', 'done', 'failed'
+    params: Dict[str, Any] = {}
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+# --- 11. AI 分析 (AI Analysis) ---
+class AnalysisResult(BaseModel):
+    analysis: str
+    cached: bool = False # True when a stored report was reused
+    response_count: int = 0 # Responses covered by the report
+    generated_at: Optional[datetime] = None # Set for reused reports
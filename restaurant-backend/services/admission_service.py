@@ -0,0 +1,113 @@
+"""
+Admission control for the customer submit path.
+
+A QR-code promotion can send thousands of submissions at once. Before any datastore
+work, `submit_response` passes two per-worker checks:
+
+- token buckets per customer and per survey (SUBMIT_RATE_* tokens/second, SUBMIT_BURST_*
+  capacity), rejected with 429;
+- a cap on concurrent submissions (SUBMIT_MAX_CONCURRENCY), waiting at most
+  SUBMIT_QUEUE_TIMEOUT seconds for a slot, rejected with 503.
+
+Rejections carry a Retry-After header, so excess load is shed in microseconds instead
+of queueing behind retrying queries and starving the dashboards on the same worker.
+A rate of 0 (or a concurrency of 0) disables that check.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Hashable
+from fastapi import HTTPException
+import metrics
+
+SUBMIT_RATE_PER_CUSTOMER = float(os.getenv("SUBMIT_RATE_PER_CUSTOMER", "0.2"))
+SUBMIT_BURST_PER_CUSTOMER = float(os.getenv("SUBMIT_BURST_PER_CUSTOMER", "3"))
+SUBMIT_RATE_PER_SURVEY = float(os.getenv("SUBMIT_RATE_PER_SURVEY", "100"))
+SUBMIT_BURST_PER_SURVEY = float(os.getenv("SUBMIT_BURST_PER_SURVEY", "300"))
+SUBMIT_MAX_CONCURRENCY = int(os.getenv("SUBMIT_MAX_CONCURRENCY", "64"))
+SUBMIT_QUEUE_TIMEOUT = float(os.getenv("SUBMIT_QUEUE_TIMEOUT", "0.1"))
+# Buckets kept per limiter; the least recently used ones are dropped (a dropped bucket is full)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class TokenBuckets:
+    """
+    One token bucket per key, refilled continuously at `rate` tokens/second up to `burst`.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def take(self, key: Hashable) -> float:
+        """
+        Takes one token. Returns 0 when allowed, otherwise the seconds until one is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+
+customer_limiter = TokenBuckets("customer", SUBMIT_RATE_PER_CUSTOMER, SUBMIT_BURST_PER_CUSTOMER)
+survey_limiter = TokenBuckets("survey", SUBMIT_RATE_PER_SURVEY, SUBMIT_BURST_PER_SURVEY)
+
+_slots = asyncio.Semaphore(SUBMIT_MAX_CONCURRENCY) if SUBMIT_MAX_CONCURRENCY > 0 else None
+
+
+def _reject(status_code: int, reason: str, retry_after: float, detail: str):
+    metrics.submit_rejections.inc(reason)
+    raise HTTPException(status_code=status_code, detail=detail,
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+def check_rate(customer_id: str, survey_id: str):
+    """
+    Raises 429 when the customer or the survey is over its rate.
+    """
+    wait = customer_limiter.take(customer_id)
+    if wait:
+        _reject(429, "customer_rate", wait, "Too many submissions, please wait a moment")
+    wait = survey_limiter.take(survey_id)
+    if wait:
+        _reject(429, "survey_rate", wait, "This survey is very busy, please try again shortly")
+
+
+@asynccontextmanager
+async def submit_slot():
+    """
+    Holds one of the SUBMIT_MAX_CONCURRENCY submit slots; raises 503 if none frees up in time.
+    """
+    if _slots is None:
+        yield
+        return
+    try:
+        await asyncio.wait_for(_slots.acquire(), SUBMIT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        _reject(503, "concurrency", 1, "Server busy, please try again shortly")
+    try:
+        yield
+    finally:
+        _slots.release()
@@ -1,77 +1,215 @@
 import os
+import asyncio
+import hashlib
+import json
+import time
 import traceback
-import google.generativeai as genai
 from dotenv import load_dotenv
 import database
-from collections import defaultdict
+import metrics
 from fastapi import HTTPException
+from services import prompt_builder
 
 # Load environment variables
 load_dotenv(override=True)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
 
+# Preferred models, best first; the first one the API key can use wins
+MODEL_CANDIDATES = [
+    "gemini-2.5-flash",
+    "gemini-2.5-pro",
+    "gemini-2.0-flash",
+    "gemini-1.5-flash"
+]
+DEFAULT_MODEL = "gemini-2.5-flash"
+GEMINI_MODEL_REFRESH_SECONDS = float(os.getenv("GEMINI_MODEL_REFRESH_SECONDS", "3600"))
+# Analyses generated at once per worker (background job pool size)
+AI_JOB_CONCURRENCY = int(os.getenv("AI_JOB_CONCURRENCY", "4"))
 
-def analyze_survey(survey_id: str, language: str):
+_model_name = None
+_model_lock = asyncio.Lock()
+_genai = None
+
+
+async def load_genai():
     """
-    Generates an AI analysis for a specific survey using Google Gemini.
+    Imports and configures google.generativeai on first use. The SDK (gRPC/protobuf)
+    is the slowest import of the app, so workers that never analyze never pay for it;
+    the first import runs in a thread to keep the event loop serving.
     """
-    print(f"DEBUG: Analyzing survey {survey_id} in {language}")
+    global _genai
+    if _genai is None:
+        def _import():
+            import google.generativeai as genai
+            if GEMINI_API_KEY:
+                genai.configure(api_key=GEMINI_API_KEY)
+            return genai
+        _genai = await asyncio.to_thread(_import)
+    return _genai
+
+
+async def _gemini_call(call: str, model: str, func):
+    """
+    Awaits one Gemini API call, counting it (ok / error) and timing it for /metrics.
+    """
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await func()
+        outcome = "ok"
+        return result
+    finally:
+        metrics.gemini_requests.inc(model, call, outcome)
+        metrics.gemini_request_duration.observe(model, call, value=time.perf_counter() - started)
 
-    if not GEMINI_API_KEY:
-        raise HTTPException(status_code=500, detail="Gemini API Key not configured on server.")
+
+async def refresh_model_name() -> str:
+    """
+    Lists the available models and picks the best candidate (the default if listing fails).
+    """
+    global _model_name
+    chosen_model_name = DEFAULT_MODEL
 
     try:
-        # 1. Fetch data
-        survey = database.get_survey_by_id(survey_id)
-        if not survey:
-            raise HTTPException(status_code=404, detail="Survey not found")
+        genai = await load_genai()
+        # list_models() is a blocking call, keep it off the event loop
+        models = await _gemini_call("list_models", "-",
+                                    lambda: asyncio.to_thread(lambda: list(genai.list_models())))
+        available_models = []
+        for m in models:
+            if 'generateContent' in m.supported_generation_methods:
+                available_models.append(m.name)
+
+        print(f"DEBUG: Found models: {available_models}")
+
+        for cand in MODEL_CANDIDATES:
+            if f"models/{cand}" in available_models:
+                chosen_model_name = cand
+                break
+    except Exception as list_err:
+        print(f"DEBUG: Failed to list models, defaulting to {chosen_model_name}. Error: {list_err}")
+        if _model_name:
+            return _model_name  # Keep the last good choice
+
+    _model_name = chosen_model_name
+    return _model_name
+
+
+async def get_model_name() -> str:
+    if _model_name is None:
+        async with _model_lock:
+            if _model_name is None:
+                await refresh_model_name()
+    return _model_name
+
+
+async def model_refresh_loop():
+    """
+    Background task (started in the app lifespan): re-resolves the model periodically.
+    The first resolution happens on the first analysis, so boot does not load the SDK.
+    """
+    if not GEMINI_API_KEY:
+        return
+    while True:
+        await asyncio.sleep(GEMINI_MODEL_REFRESH_SECONDS)
+        if _model_name is not None:
+            await refresh_model_name()
 
-        responses = database.get_responses(survey_id)
-        if not responses:
-            msg = "No data available." if language == 'en' else "暂无数据。"
-            return msg
 
-        # 2. Separate Active vs Unlinked Data
-        active_q_ids = {q['id']: q for q in survey['questions']}
+def question_version(survey: dict) -> str:
+    """
+    Fingerprint of the survey's question definitions; editing questions invalidates cached reports.
+    """
+    raw = json.dumps(survey.get('questions') or [], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
 
-        active_data_parts = []
-        unlinked_data_parts = []
 
-        # Group answers by Question ID
-        answers_map = defaultdict(list)
-        for r in responses:
-            if not r.get('answers'): continue
-            for q_id, val in r['answers'].items():
-                if val and str(val).strip():
-                    answers_map[q_id].append(str(val).strip())
+def _reusable(cached: dict, version: str, count: int, latest: str, max_new_responses: int) -> bool:
+    if cached.get('question_version') != version:
+        return False
+    new_responses = count - (cached.get('response_count') or 0)
+    if new_responses == 0:
+        # Same count and same newest row: nothing changed since the report
+        return cached.get('latest_submitted_at') == latest
+    return 0 < new_responses <= max_new_responses
 
-        # Build Active Data String
-        for q_id, q_obj in active_q_ids.items():
-            ans_list = answers_map.get(q_id, [])
-            if ans_list:
-                # Limit size to prevent context overflow (simplified approach)
-                joined_ans = ", ".join(ans_list[:100])
-                active_data_parts.append(f"Question: {q_obj['text']}\nAnswers: {joined_ans}")
 
-        active_data_str = "\n\n".join(active_data_parts) if active_data_parts else "No active data."
+async def analyze_survey(survey_id: str, language: str, max_new_responses: int = 0, force: bool = False):
+    """
+    Returns the AI analysis of a survey, reusing the last stored report when the survey's
+    questions, language and response high-water mark (count + latest submitted_at) are
+    unchanged. With max_new_responses > 0 a report is also reused if at most that many
+    responses arrived since it was generated. `force` always regenerates.
+    """
+    survey = await database.get_survey_by_id(survey_id)
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
 
-        # Build Unlinked Data String
-        for q_id, ans_list in answers_map.items():
-            if q_id not in active_q_ids:
-                joined_ans = ", ".join(ans_list[:50])
-                unlinked_data_parts.append(f"Old Question (ID: {q_id}): {joined_ans}")
+    version = question_version(survey)
+    count, latest = await database.get_response_high_water(survey_id)
 
-        unlinked_data_str = "\n\n".join(unlinked_data_parts) if unlinked_data_parts else "No historical data."
+    if not force:
+        try:
+            cached = await database.get_latest_analysis(survey_id, language)
+        except Exception as e:
+            print(f"⚠️ Analysis cache lookup failed: {e}")
+            cached = None
+        if cached and _reusable(cached, version, count, latest, max_new_responses):
+            print(f"DEBUG: Reusing stored analysis for survey {survey_id} ({language})")
+            return {
+                "analysis": cached['analysis'],
+                "cached": True,
+                "response_count": cached['response_count'],
+                "generated_at": cached.get('created_at')
+            }
+
+    analysis, model_name = await generate_analysis(survey, language)
+
+    if count:
+        try:
+            await database.insert_analysis({
+                "survey_id": survey_id,
+                "language": language,
+                "question_version": version,
+                "response_count": count,
+                "latest_submitted_at": latest,
+                "model": model_name,
+                "analysis": analysis
+            })
+        except Exception as e:
+            print(f"⚠️ Failed to store analysis: {e}")
+
+    return {"analysis": analysis, "cached": False, "response_count": count, "generated_at": None}
+
+
+async def generate_analysis(survey: dict, language: str):
+    """
+    Generates an AI analysis for a specific survey using Google Gemini.
+    Returns (analysis_text, model_name).
+    """
+    survey_id = survey['id']
+    print(f"DEBUG: Analyzing survey {survey_id} in {language}")
+
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="Gemini API Key not configured on server.")
+
+    try:
+        # 1. Fetch and condense data (counts for choices, deduplicated text within the token budget)
+        data = await prompt_builder.build_survey_data(survey)
+        if not data["total"]:
+            msg = "No data available." if language == 'en' else "暂无数据。"
+            return msg, None
+
+        active_data_str = data["active"]
+        unlinked_data_str = data["unlinked"]
 
-        # 3. Construct Prompt
+        # 2. Construct Prompt
         lang_name = "Chinese" if language == 'zh' else "English"
 
         prompt = f"""You are a world-class restaurant business consultant. Analyze the following survey data for "{survey['name']}".
 
-DATA OVERVIEW:
+DATA OVERVIEW ({data["total"]} responses; choice questions as counts, repeated text answers with (xN) frequency):
 {active_data_str}
 
 HISTORICAL CONTEXT (Old versions of questions):
@@ -95,42 +233,27 @@ Strictly follow this structure for your analysis:
 - Explain *why* each question is needed.
 """
 
-        # 4. AI Model Selection
-        print("DEBUG: Listing available models via API to find a match...")
-
-        candidates = [
-            "gemini-2.5-flash",
-            "gemini-2.5-pro",
-            "gemini-2.0-flash",
-            "gemini-1.5-flash"
-        ]
-
-        chosen_model_name = "gemini-2.5-flash"  # Default fallback
-
-        try:
-            available_models = []
-            for m in genai.list_models():
-                if 'generateContent' in m.supported_generation_methods:
-                    available_models.append(m.name)
-
-            print(f"DEBUG: Found models: {available_models}")
-
-            for cand in candidates:
-                if f"models/{cand}" in available_models:
-                    chosen_model_name = cand
-                    break
-        except Exception as list_err:
-            print(f"DEBUG: Failed to list models, defaulting to {chosen_model_name}. Error: {list_err}")
-
+        # 3. AI Model Selection (resolved once, refreshed in the background)
+        chosen_model_name = await get_model_name()
         print(f"DEBUG: Selected model: {chosen_model_name}")
+        genai = await load_genai()
         model = genai.GenerativeModel(chosen_model_name)
 
-        # 5. Execute
-        response = model.generate_content(prompt)
+        # 4. Execute
+        response = await _gemini_call("generate_content", chosen_model_name,
+                                      lambda: model.generate_content_async(prompt))
         print("DEBUG: Response received.")
 
-        return response.text
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.gemini_tokens.inc(chosen_model_name, "prompt", amount=getattr(usage, "prompt_token_count", 0) or 0)
+            metrics.gemini_tokens.inc(chosen_model_name, "output",
+                                      amount=getattr(usage, "candidates_token_count", 0) or 0)
+
+        return response.text, chosen_model_name
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("!!! AI ANALYSIS ERROR !!!")
         traceback.print_exc()
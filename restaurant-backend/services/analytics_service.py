@@ -0,0 +1,134 @@
+from collections import Counter, defaultdict
+from fastapi import HTTPException
+import database
+
+# Text answers returned per question; counts always cover every response.
+DEFAULT_TEXT_LIMIT = 50
+
+
+def _split_selections(val: str):
+    # Multi-choice answers are stored as "A, B, C" (same format the frontend writes)
+    return val.split(', ')
+
+
+def _is_value_merged(val: str, choice_questions: list):
+    """
+    An orphaned value counts as "merged" when it matches an option of any current
+    choice question (partially, for multi-choice). Mirrors the dashboard's smart merge.
+    """
+    for q in choice_questions:
+        options = q.get('options') or []
+        if val in options:
+            return True
+        if q.get('type') == 'multi':
+            if any(p in options for p in _split_selections(val)):
+                return True
+    return False
+
+
+async def summarize_survey(survey_id: str, text_limit: int = DEFAULT_TEXT_LIMIT):
+    """
+    Aggregates all answers of a survey server-side: option counts (with smart merge of
+    orphaned question ids), "other" counts, capped text samples and unlinked answers.
+    """
+    survey = await database.get_survey_by_id(survey_id)
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
+
+    questions = survey.get('questions') or []
+    active_q_ids = {q['id'] for q in questions}
+    choice_questions = [q for q in questions if q.get('type') != 'text']
+
+    total_responses = 0
+    selections = defaultdict(Counter)
+    merged_counts = Counter()
+    other_samples = defaultdict(list)
+    text_counts = Counter()
+    text_samples = defaultdict(list)
+    unlinked_counts = Counter()
+    unlinked_samples = defaultdict(list)
+
+    async for batch in database.iter_response_answers(survey_id):
+        for answers in batch:
+            total_responses += 1
+            orphans = {k: str(v) for k, v in answers.items() if k not in active_q_ids and v}
+
+            for q in questions:
+                q_id = q['id']
+                ans = answers.get(q_id)
+
+                if q.get('type') == 'text':
+                    if ans:
+                        text_counts[q_id] += 1
+                        if len(text_samples[q_id]) < text_limit:
+                            text_samples[q_id].append(str(ans))
+                    continue
+
+                options = q.get('options') or []
+
+                # 1. Direct ID Match
+                if ans:
+                    for sel in _split_selections(str(ans)):
+                        selections[q_id][sel] += 1
+                        if q.get('allow_other') and sel and sel not in options \
+                                and len(other_samples[q_id]) < text_limit:
+                            other_samples[q_id].append(sel)
+
+                # 2. Smart Merge (Orphan Recovery)
+                for val in orphans.values():
+                    if q.get('type') == 'multi':
+                        matches = [p for p in _split_selections(val) if p in options]
+                        if matches:
+                            for m in matches:
+                                selections[q_id][m] += 1
+                            merged_counts[q_id] += 1
+                    elif val in options:
+                        selections[q_id][val] += 1
+                        merged_counts[q_id] += 1
+
+            # 3. Unlinked answers that were not merged into any chart
+            for k, val in orphans.items():
+                if _is_value_merged(val, choice_questions):
+                    continue
+                unlinked_counts[k] += 1
+                if len(unlinked_samples[k]) < text_limit:
+                    unlinked_samples[k].append(val)
+
+    question_summaries = []
+    for q in questions:
+        q_id = q['id']
+        summary = {
+            "question_id": q_id,
+            "text": q.get('text', ''),
+            "type": q.get('type', 'choice'),
+            "options": [],
+            "other_count": 0,
+            "other_samples": [],
+            "merged_count": merged_counts[q_id],
+            "total_votes": 0,
+            "text_count": text_counts[q_id],
+            "text_samples": text_samples[q_id]
+        }
+
+        if q.get('type') != 'text':
+            options = q.get('options') or []
+            counts = selections[q_id]
+            summary["options"] = [{"name": opt, "value": counts[opt]} for opt in options]
+            if q.get('allow_other'):
+                summary["other_count"] = sum(v for sel, v in counts.items() if sel and sel not in options)
+                summary["other_samples"] = other_samples[q_id]
+            summary["total_votes"] = sum(o["value"] for o in summary["options"]) + summary["other_count"]
+
+        question_summaries.append(summary)
+
+    unlinked = [
+        {"question_id": k, "count": unlinked_counts[k], "samples": unlinked_samples[k]}
+        for k in unlinked_counts
+    ]
+
+    return {
+        "survey_id": survey_id,
+        "total_responses": total_responses,
+        "questions": question_summaries,
+        "unlinked": unlinked
+    }
@@ -0,0 +1,172 @@
+"""
+Flat exports of survey responses (CSV / Parquet) for spreadsheets and BI tools.
+
+One row per response, one column per question (headed by the question text), written
+page by page from the keyset iterator so the full dataset is never held in memory.
+
+Export job files are written to EXPORT_DIR and downloaded from there, so with several
+instances it must be storage they all mount; otherwise a download only works on the
+instance that ran the job. Files older than EXPORT_TTL are removed after each export job.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from typing import List, Optional
+from fastapi import HTTPException
+import database
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/exports")
+EXPORT_TTL = float(os.getenv("EXPORT_TTL", "86400"))
+EXPORT_FORMATS = ("csv", "parquet")
+
+BASE_COLUMNS = ["response_id", "survey_id", "survey_name", "merchant_id", "customer_id", "submitted_at"]
+UNLINKED_COLUMN = "unlinked_answers"  # JSON of answers to questions no longer in the survey
+
+
+async def resolve_surveys(survey_id: Optional[str] = None, merchant_id: Optional[str] = None,
+                          owner_id: Optional[str] = None) -> List[dict]:
+    """
+    Export scope: one survey, one store's surveys, or every survey of an owner and its stores.
+    """
+    if survey_id:
+        survey = await database.get_survey_by_id(survey_id)
+        if not survey:
+            raise HTTPException(status_code=404, detail="Survey not found")
+        return [survey]
+    if merchant_id:
+        surveys = await database.get_surveys_by_merchant(merchant_id)
+        return [s for s in surveys if s['merchant_id'] == merchant_id]
+    if owner_id:
+        return await database.get_surveys_by_merchant(owner_id)
+    raise HTTPException(status_code=400, detail="One of survey_id, merchant_id or owner_id is required")
+
+
+class ExportLayout:
+    """
+    Column layout shared by every batch of one export.
+    """
+
+    def __init__(self, surveys: List[dict]):
+        self.surveys = {s['id']: s for s in surveys}
+
+        question_ids = []
+        texts = {}
+        for s in surveys:
+            for q in s.get('questions') or []:
+                if q['id'] not in texts:
+                    question_ids.append(q['id'])
+                    texts[q['id']] = q.get('text') or q['id']
+
+        # Headers are question texts; identical texts get the id appended to stay unique
+        seen = {}
+        for text in texts.values():
+            seen[text] = seen.get(text, 0) + 1
+        self.question_ids = question_ids
+        self.headers = BASE_COLUMNS + [
+            texts[q_id] if seen[texts[q_id]] == 1 else f"{texts[q_id]} [{q_id[:8]}]"
+            for q_id in question_ids
+        ] + [UNLINKED_COLUMN]
+        self._known = set(question_ids)
+
+    def flatten(self, r: dict) -> list:
+        survey = self.surveys.get(r['survey_id'], {})
+        answers = r.get('answers') or {}
+        unlinked = {k: v for k, v in answers.items() if k not in self._known and v}
+        return [
+            r['id'], r['survey_id'], survey.get('name', ''), survey.get('merchant_id', ''),
+            r.get('customer_id', ''), r['submitted_at']
+        ] + [
+            answers.get(q_id, '') for q_id in self.question_ids
+        ] + [json.dumps(unlinked, ensure_ascii=False) if unlinked else '']
+
+
+async def iter_csv(surveys: List[dict]):
+    """
+    Yields CSV text one page of responses at a time (UTF-8 BOM first, for Excel).
+    """
+    layout = ExportLayout(surveys)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    writer.writerow(layout.headers)
+    yield "\ufeff" + buf.getvalue()
+
+    if not surveys:
+        return
+
+    async for page in database.iter_responses(list(layout.surveys)):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(layout.flatten(r) for r in page)
+        yield buf.getvalue()
+
+
+async def write_parquet(surveys: List[dict], path: str):
+    """
+    Writes the export to `path` as Parquet, one row group per page of responses.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow on the server")
+
+    layout = ExportLayout(surveys)
+    schema = pa.schema([(h, pa.string()) for h in layout.headers])
+    writer = pq.ParquetWriter(path, schema)
+
+    def write_rows(rows: List[list]):
+        columns = list(zip(*rows)) if rows else [[] for _ in layout.headers]
+        # Nulls (e.g. an anonymous customer_id) stay null, like the empty CSV field
+        arrays = [pa.array([None if v is None else str(v) for v in col], pa.string()) for col in columns]
+        table = pa.Table.from_arrays(arrays, schema=schema)
+        writer.write_table(table)
+
+    try:
+        if surveys:
+            async for page in database.iter_responses(list(layout.surveys)):
+                await asyncio.to_thread(write_rows, [layout.flatten(r) for r in page])
+    finally:
+        writer.close()
+    return path
+
+
+async def write_export(surveys: List[dict], fmt: str, path: str) -> dict:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    if fmt == "parquet":
+        await write_parquet(surveys, path)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            async for chunk in iter_csv(surveys):
+                await asyncio.to_thread(f.write, chunk)
+
+    return {"path": path, "format": fmt, "bytes": os.path.getsize(path)}
+
+
+def export_path(name: str, fmt: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{name}.{fmt}")
+
+
+def remove_expired():
+    """
+    Deletes export files last written more than EXPORT_TTL seconds ago.
+    """
+    cutoff = time.time() - EXPORT_TTL
+    removed = 0
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # Removed concurrently by another worker
+    if removed:
+        print(f"✅ Removed {removed} expired export files")
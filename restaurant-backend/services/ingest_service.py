@@ -0,0 +1,249 @@
+"""
+Write-behind ingestion of survey responses.
+
+With RESPONSE_INGEST_MODE=journal, `submit_response` appends the new row to a local
+append-only journal (NDJSON, fsync'd) and returns the lottery result right away. A
+background flusher bulk-inserts journaled rows once INGEST_BATCH_SIZE rows are pending
+or the oldest one is INGEST_FLUSH_INTERVAL seconds old.
+
+Each worker owns one journal file in INGEST_JOURNAL_DIR (held with an exclusive flock)
+plus a `.offset` checkpoint of how far it has been flushed. On startup a worker replays
+its own file and any journal whose owner died; inserts skip ids that already exist,
+so replaying a partly flushed batch is safe. Journal files are only removed by the
+lock holder, and a worker checks after locking that the path still names the file it
+locked.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import os
+import time
+import traceback
+from typing import List, Optional
+import database
+from services import rollup_service
+
+INGEST_MODE = os.getenv("RESPONSE_INGEST_MODE", "direct")  # 'direct' or 'journal'
+INGEST_JOURNAL_DIR = os.getenv("INGEST_JOURNAL_DIR", "data/journal")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "2"))
+INGEST_FSYNC = os.getenv("INGEST_FSYNC", "1") != "0"
+
+
+class ResponseJournal:
+    """
+    Append-only NDJSON file plus a checkpoint of the flushed byte offset.
+    """
+
+    def __init__(self, path: str, blocking: bool = True):
+        self.path = path
+        self.offset_path = path + ".offset"
+        while True:
+            self._fh = open(path, "a+b")
+            try:
+                fcntl.flock(self._fh, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except OSError:
+                self._fh.close()
+                raise
+            # Files are only removed under the lock: if `path` is still the inode we
+            # locked, it is ours. Otherwise a replaying worker removed it between our
+            # open and flock, so start over on a fresh file.
+            if self._is_current():
+                return
+            self._fh.close()
+
+    def _is_current(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino == os.fstat(self._fh.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def append(self, rows: List[dict]) -> List[int]:
+        """
+        Appends rows durably and returns the end offset of each one.
+        """
+        offsets = []
+        for row in rows:
+            self._fh.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+            offsets.append(self._fh.tell())
+        self._fh.flush()
+        if INGEST_FSYNC:
+            os.fsync(self._fh.fileno())
+        return offsets
+
+    def checkpoint(self) -> int:
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def commit(self, offset: int):
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+            f.flush()
+            if INGEST_FSYNC:
+                os.fsync(f.fileno())
+        os.replace(tmp, self.offset_path)
+
+    def read_unflushed(self) -> List[tuple]:
+        """
+        Returns (row, end_offset) for every row after the checkpoint.
+        A torn last line (crash mid-write) is cut off.
+        """
+        entries = []
+        good_end = self.checkpoint()
+        self._fh.seek(good_end)
+        for line in self._fh:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                break
+            good_end += len(line)
+            entries.append((row, good_end))
+        self._fh.truncate(good_end)
+        self._fh.seek(0, os.SEEK_END)
+        return entries
+
+    def compact(self):
+        """
+        Empties the journal once everything in it has been flushed.
+        """
+        if self.checkpoint() == self._fh.seek(0, os.SEEK_END):
+            self._fh.truncate(0)
+            self.commit(0)
+
+    def close(self, remove: bool = False):
+        if remove:
+            # Still holding the lock. The checkpoint goes first, so a worker that
+            # creates a fresh journal at this path never reads the old offset.
+            for p in (self.offset_path, self.path):
+                if os.path.exists(p):
+                    os.remove(p)
+        self._fh.close()
+
+
+_journal: Optional[ResponseJournal] = None
+_pending: List[tuple] = []  # (row, end_offset, enqueued_at)
+_write_lock = asyncio.Lock()
+_flush_lock = asyncio.Lock()
+_wakeup = asyncio.Event()
+_flusher: Optional[asyncio.Task] = None
+
+
+def enabled() -> bool:
+    return INGEST_MODE == "journal"
+
+
+async def _insert_batch(rows: List[dict]):
+    inserted = await database.insert_responses(rows)
+    # Only rows that were new count towards the rollup (replays are skipped)
+    await rollup_service.record_responses(inserted)
+
+
+async def _replay_orphans():
+    for path in glob.glob(os.path.join(INGEST_JOURNAL_DIR, "responses-*.ndjson")):
+        if _journal and path == _journal.path:
+            continue
+        try:
+            orphan = ResponseJournal(path, blocking=False)
+        except OSError:
+            continue  # Still owned by a live worker
+
+        try:
+            rows = [row for row, _ in orphan.read_unflushed()]
+            for i in range(0, len(rows), INGEST_BATCH_SIZE):
+                await _insert_batch(rows[i:i + INGEST_BATCH_SIZE])
+            print(f"✅ Replayed {len(rows)} journaled responses from {path}")
+            orphan.close(remove=True)
+        except Exception:
+            traceback.print_exc()
+            orphan.close()
+
+
+async def start():
+    global _journal, _flusher
+    if not enabled() or _journal is not None:
+        return
+
+    os.makedirs(INGEST_JOURNAL_DIR, exist_ok=True)
+    _journal = ResponseJournal(os.path.join(INGEST_JOURNAL_DIR, f"responses-{os.getpid()}.ndjson"))
+
+    now = time.monotonic()
+    _pending.extend((row, offset, now) for row, offset in _journal.read_unflushed())
+    await _replay_orphans()
+
+    _flusher = asyncio.create_task(_flush_loop())
+
+
+async def stop():
+    global _journal, _flusher
+    if _flusher is None:
+        return
+
+    _flusher.cancel()
+    try:
+        await _flusher
+    except asyncio.CancelledError:
+        pass
+    _flusher = None
+
+    await flush(force=True)
+    _journal.close(remove=not _pending)
+    _journal = None
+
+
+async def submit(row: dict):
+    """
+    Durably journals one response row; it is inserted by the background flusher.
+    """
+    async with _write_lock:
+        offsets = await asyncio.to_thread(_journal.append, [row])
+        _pending.append((row, offsets[0], time.monotonic()))
+
+    if len(_pending) >= INGEST_BATCH_SIZE:
+        _wakeup.set()
+
+
+def _due() -> bool:
+    if not _pending:
+        return False
+    return len(_pending) >= INGEST_BATCH_SIZE or time.monotonic() - _pending[0][2] >= INGEST_FLUSH_INTERVAL
+
+
+async def flush(force: bool = False):
+    async with _flush_lock:
+        while _pending and (force or _due()):
+            batch = _pending[:INGEST_BATCH_SIZE]
+            try:
+                await _insert_batch([row for row, _, _ in batch])
+            except Exception as e:
+                # Rows stay journaled and pending; the next tick retries them
+                print(f"⚠️ Journal flush failed, {len(_pending)} rows pending: {e}")
+                return
+
+            del _pending[:len(batch)]
+            async with _write_lock:
+                _journal.commit(batch[-1][1])
+                if not _pending:
+                    _journal.compact()
+
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=INGEST_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        await flush()
+
+
+def stats() -> dict:
+    return {
+        "mode": INGEST_MODE,
+        "pending": len(_pending),
+        "oldest_pending_age_s": round(time.monotonic() - _pending[0][2], 3) if _pending else 0.0
+    }
@@ -0,0 +1,149 @@
+"""
+In-process background jobs (exports, AI analyses), polled by id.
+
+Jobs run as asyncio tasks on the worker that accepted them. Each kind has its own
+bounded pool (JOB_MAX_CONCURRENCY by default, see `register_kind`); jobs beyond it
+wait in 'queued'. A kind can also register a cleanup that runs after each of its jobs. Submitting a job whose `dedup_key` matches one still queued or
+running returns the existing job instead of starting another.
+
+Job records are mirrored to the `background_jobs` table so a status poll answered
+by another worker still finds them (migrations/004_background_jobs.sql).
+"""
+import asyncio
+import os
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException
+import database
+
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "2"))
+# Queued + running jobs per kind before new submissions are rejected
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+# Finished jobs kept in memory for polling; the oldest are dropped first
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "200"))
+
+_jobs: "OrderedDict[str, dict]" = OrderedDict()
+_tasks: Dict[str, asyncio.Task] = {}
+_active_by_key: Dict[str, str] = {}
+_pools: Dict[str, asyncio.Semaphore] = {}
+_cleanups: Dict[str, Callable[[], Any]] = {}
+
+PERSISTED_FIELDS = ("id", "kind", "status", "params", "created_at", "started_at", "finished_at", "result", "error")
+
+
+def register_kind(kind: str, max_concurrency: int, cleanup: Optional[Callable[[], Any]] = None):
+    """
+    `cleanup` (blocking, run in a thread) is called after each job of this kind finishes.
+    """
+    _pools[kind] = asyncio.Semaphore(max_concurrency)
+    if cleanup:
+        _cleanups[kind] = cleanup
+
+
+def _pool(kind: str) -> asyncio.Semaphore:
+    if kind not in _pools:
+        register_kind(kind, JOB_MAX_CONCURRENCY)
+    return _pools[kind]
+
+
+def _prune():
+    finished = [j_id for j_id, j in _jobs.items() if j["status"] in ("done", "failed")]
+    for j_id in finished[:max(0, len(finished) - JOB_HISTORY_SIZE)]:
+        del _jobs[j_id]
+
+
+async def _persist(job: dict):
+    # Best effort: the in-memory record stays authoritative on this worker
+    try:
+        await database.upsert_job({k: job[k] for k in PERSISTED_FIELDS})
+    except Exception as e:
+        print(f"⚠️ Failed to persist job {job['id']}: {e}")
+
+
+async def _run(job: dict, func: Callable[[dict], Awaitable[Any]]):
+    try:
+        async with _pool(job["kind"]):
+            job["status"] = "running"
+            job["started_at"] = datetime.now().isoformat()
+            await _persist(job)
+            try:
+                job["result"] = await func(job)
+                job["status"] = "done"
+            except Exception as e:
+                traceback.print_exc()
+                job["status"] = "failed"
+                job["error"] = getattr(e, "detail", None) or str(e)
+    finally:
+        if job["status"] not in ("done", "failed"):
+            job["status"] = "failed"
+            job["error"] = "Cancelled (server shutting down)"
+        job["finished_at"] = datetime.now().isoformat()
+        _tasks.pop(job["id"], None)
+        if job.get("dedup_key"):
+            _active_by_key.pop(job["dedup_key"], None)
+        _prune()
+        await _persist(job)
+        await _cleanup(job["kind"])
+
+
+async def _cleanup(kind: str):
+    cleanup = _cleanups.get(kind)
+    if cleanup is None:
+        return
+    try:
+        await asyncio.to_thread(cleanup)
+    except Exception as e:
+        print(f"⚠️ Cleanup after {kind} job failed: {e}")
+
+
+async def submit(kind: str, func: Callable[[dict], Awaitable[Any]], params: Optional[dict] = None,
+                 dedup_key: Optional[str] = None) -> dict:
+    """
+    Schedules `func(job)` and returns the job record right away.
+    """
+    if dedup_key and dedup_key in _active_by_key:
+        return _jobs[_active_by_key[dedup_key]]
+
+    pending = sum(1 for j in _jobs.values() if j["kind"] == kind and j["status"] in ("queued", "running"))
+    if pending >= JOB_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Too many background jobs queued, try again later")
+
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "status": "queued",
+        "params": params or {},
+        "dedup_key": dedup_key,
+        "created_at": datetime.now().isoformat(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None
+    }
+    _jobs[job["id"]] = job
+    if dedup_key:
+        _active_by_key[dedup_key] = job["id"]
+    await _persist(job)
+    _tasks[job["id"]] = asyncio.create_task(_run(job, func))
+    return job
+
+
+async def get(job_id: str) -> Optional[dict]:
+    job = _jobs.get(job_id)
+    if job is None:
+        # Accepted by another worker
+        try:
+            job = await database.get_job(job_id)
+        except Exception as e:
+            print(f"⚠️ Job lookup failed: {e}")
+    return job
+
+
+async def shutdown():
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,24 +1,120 @@
+import os
 import random
+from typing import List, Optional
 import database
+from cache import TTLCache
 
+# Compiled lotteries and survey -> lottery links, cached per worker.
+# Writes through the lottery/survey routers invalidate them locally;
+# other workers pick up changes after at most the TTL.
+LOTTERY_CACHE_TTL = float(os.getenv("LOTTERY_CACHE_TTL", "300"))
+LOTTERY_CACHE_SIZE = int(os.getenv("LOTTERY_CACHE_SIZE", "5000"))
 
-def run_lottery_algorithm(lottery_id: str):
+compiled_cache = TTLCache("compiled_lotteries", LOTTERY_CACHE_TTL, LOTTERY_CACHE_SIZE)
+survey_lottery_cache = TTLCache("survey_lottery", LOTTERY_CACHE_TTL, LOTTERY_CACHE_SIZE)
+
+# survey_lottery_cache value for "survey has no lottery" (None means cache miss)
+_NO_LOTTERY = ""
+
+
+class CompiledLottery:
     """
-    Execute the lottery logic based on probabilities defined in the database.
+    A lottery compiled into an alias table (Vose's method): O(1) per draw.
+
+    Prize probabilities are percentages. Like the original cumulative walk over
+    uniform(0, 100), prizes beyond a running total of 100 are clipped and the
+    remaining share (100 - sum) is the "no prize" outcome.
     """
-    try:
-        lottery = database.get_lottery_by_id(lottery_id)
-        if not lottery or not lottery.get("prizes"):
+
+    def __init__(self, prizes: List[dict]):
+        outcomes = []
+        weights = []
+        remaining = 100.0
+        for prize in prizes or []:
+            p = min(max(float(prize.get("probability") or 0), 0.0), remaining)
+            remaining -= p
+            if p > 0:
+                outcomes.append(prize)
+                weights.append(p)
+        if remaining > 0:
+            outcomes.append(None)
+            weights.append(remaining)
+
+        self.outcomes = outcomes
+        self.prob, self.alias = self._build_alias(weights)
+
+    @staticmethod
+    def _build_alias(weights: List[float]):
+        n = len(weights)
+        if n == 0:
+            return [], []
+
+        total = sum(weights)
+        scaled = [w * n / total for w in weights]
+        prob = [0.0] * n
+        alias = [0] * n
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = (scaled[l] + scaled[s]) - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Leftovers are 1.0 up to floating point error
+        for i in large + small:
+            prob[i] = 1.0
+
+        return prob, alias
+
+    def draw(self, rng: random.Random = random) -> Optional[dict]:
+        if not self.outcomes:
             return None
+        i = int(rng.random() * len(self.outcomes))
+        if rng.random() < self.prob[i]:
+            return self.outcomes[i]
+        return self.outcomes[self.alias[i]]
 
-        lucky_number = random.uniform(0, 100)
-        current_probability = 0
 
-        for prize in lottery["prizes"]:
-            current_probability += prize["probability"]
-            if lucky_number <= current_probability:
-                return prize
-        return None
+async def get_compiled_lottery(lottery_id: str) -> CompiledLottery:
+    compiled = compiled_cache.get(lottery_id)
+    if compiled is None:
+        lottery = await database.get_lottery_by_id(lottery_id)
+        compiled = CompiledLottery(lottery.get("prizes") if lottery else [])
+        compiled_cache.set(lottery_id, compiled)
+    return compiled
+
+
+async def get_survey_lottery_id(survey_id: str) -> Optional[str]:
+    lottery_id = survey_lottery_cache.get(survey_id)
+    if lottery_id is None:
+        survey = await database.get_survey_by_id(survey_id)
+        lottery_id = (survey or {}).get("lottery_id") or _NO_LOTTERY
+        survey_lottery_cache.set(survey_id, lottery_id)
+    return lottery_id or None
+
+
+def invalidate_lottery(lottery_id: str):
+    compiled_cache.invalidate(lottery_id)
+
+
+def invalidate_survey(survey_id: str):
+    survey_lottery_cache.invalidate(survey_id)
+
+
+async def run_lottery_algorithm(lottery_id: str):
+    """
+    Execute the lottery logic based on probabilities defined in the database.
+    """
+    try:
+        compiled = await get_compiled_lottery(lottery_id)
+        return compiled.draw()
     except Exception as e:
         print(f"Algorithm Error: {e}")
         return None
@@ -0,0 +1,189 @@
+"""
+Bulk onboarding of stores (a chain's sub-stores in one request) and roll-out of a
+template survey / lottery to every store.
+
+Rows are validated one by one, then every username is checked with one set-based
+lookup per chunk and the valid rows are written with one bulk insert per chunk, so
+300 stores take a handful of round trips instead of 600. The result reports every
+input row: created (with its new id) or the reason it was skipped. Propagation
+writes all copies with one bulk insert per chunk as well.
+"""
+import csv
+import io
+import os
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from fastapi import HTTPException
+from pydantic import ValidationError
+import database
+import schemas
+
+# Rows per username lookup / bulk insert
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "5000"))
+
+ROLES = ("owner", "manager")
+
+
+def parse_csv(text: str) -> List[dict]:
+    """
+    Header row with restaurant_name, username, password and optionally role, owner_id.
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    return [{k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k and v not in (None, "")}
+            for row in reader]
+
+
+def _error(index: int, username: Optional[str], message: str) -> dict:
+    return {"row": index, "username": username, "status": "error", "id": None, "error": message}
+
+
+def _created(index: int, data: dict) -> dict:
+    return {"row": index, "username": data['username'], "status": "created", "id": data['id'], "error": None}
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors())
+
+
+async def import_merchants(rows: List[dict], owner_id: Optional[str] = None) -> dict:
+    """
+    Registers every valid row; rows without an owner_id are attached to `owner_id`.
+    Returns {"created", "failed", "rows": [per-row result in input order]}.
+    """
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"At most {MAX_IMPORT_ROWS} rows per import")
+
+    results: List[Optional[dict]] = [None] * len(rows)
+    candidates = []  # (row index, new merchant data)
+    seen = set()
+
+    for index, raw in enumerate(rows):
+        if owner_id and not raw.get('owner_id'):
+            raw = {**raw, "owner_id": owner_id}
+        try:
+            merchant = schemas.MerchantRegister(**raw)
+        except ValidationError as e:
+            results[index] = _error(index, raw.get('username'), _validation_message(e))
+            continue
+
+        if merchant.role not in ROLES:
+            results[index] = _error(index, merchant.username, f"Invalid role: {merchant.role}")
+        elif merchant.username in seen:
+            results[index] = _error(index, merchant.username, "Duplicate username in this import")
+        else:
+            seen.add(merchant.username)
+            candidates.append((index, {
+                "id": str(uuid.uuid4()),
+                "restaurant_name": merchant.restaurant_name,
+                "username": merchant.username,
+                "password": merchant.password,
+                "role": merchant.role,
+                "owner_id": str(merchant.owner_id) if merchant.owner_id else None
+            }))
+
+    for start in range(0, len(candidates), IMPORT_CHUNK_SIZE):
+        chunk = candidates[start:start + IMPORT_CHUNK_SIZE]
+        taken = await database.get_existing_usernames([data['username'] for _, data in chunk])
+
+        to_insert = []
+        for index, data in chunk:
+            if data['username'] in taken:
+                results[index] = _error(index, data['username'], "Username already exists")
+            else:
+                to_insert.append((index, data))
+        if not to_insert:
+            continue
+
+        try:
+            await database.register_merchants([data for _, data in to_insert])
+        except Exception as e:
+            # Lost a race on a username (or a bad row): retry this chunk row by row for exact errors
+            print(f"⚠️ Bulk merchant insert failed, retrying {len(to_insert)} rows one by one: {e}")
+            for index, data in to_insert:
+                try:
+                    await database.register_merchant(data)
+                except Exception as row_error:
+                    results[index] = _error(index, data['username'], str(row_error))
+                    continue
+                results[index] = _created(index, data)
+            continue
+
+        for index, data in to_insert:
+            results[index] = _created(index, data)
+
+    created = sum(1 for r in results if r['status'] == "created")
+    print(f"✅ Merchant import: {created} created, {len(results) - created} skipped")
+    return {"created": created, "failed": len(results) - created, "rows": results}
+
+
+async def _insert_chunked(insert, rows: List[dict]):
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        await insert(rows[start:start + IMPORT_CHUNK_SIZE])
+
+
+async def propagate_templates(template_survey_id: Optional[str], template_lottery_id: Optional[str],
+                              owner_id: Optional[str] = None, store_ids: Optional[List[str]] = None) -> dict:
+    """
+    Copies the template survey and/or lottery into each target store of the owner.
+    Without `owner_id` the owner is the template's merchant, or that merchant's owner
+    when the template belongs to a store. The template's own store gets no copy.
+    Copied surveys keep the template's question ids (answers stay comparable across
+    stores) and point at the store's copy of the lottery when one is propagated too,
+    otherwise at the template's own lottery_id.
+    """
+    if not template_survey_id and not template_lottery_id:
+        raise HTTPException(status_code=400, detail="template_survey_id or template_lottery_id is required")
+
+    survey = await database.get_survey_by_id(template_survey_id) if template_survey_id else None
+    if template_survey_id and not survey:
+        raise HTTPException(status_code=404, detail="Template survey not found")
+    lottery = await database.get_lottery_by_id(template_lottery_id) if template_lottery_id else None
+    if template_lottery_id and not lottery:
+        raise HTTPException(status_code=404, detail="Template lottery not found")
+
+    source_id = (survey or lottery)['merchant_id']
+    if not owner_id:
+        # Templates usually belong to a store: propagate across its owner's stores
+        source = await database.get_merchant_by_id(source_id)
+        owner_id = (source or {}).get('owner_id') or source_id
+    stores = [m['id'] for m in await database.get_merchants_by_owner(owner_id) if m['id'] != source_id]
+    skipped = []
+    if store_ids is not None:
+        owned = set(stores)
+        skipped = [s for s in store_ids if s not in owned]
+        stores = [s for s in dict.fromkeys(store_ids) if s in owned]
+
+    targets = [{"merchant_id": store_id, "survey_id": None, "lottery_id": None} for store_id in stores]
+    created_at = datetime.now().isoformat()
+
+    if lottery:
+        lottery_rows = []
+        for target in targets:
+            target["lottery_id"] = str(uuid.uuid4())
+            lottery_rows.append({
+                "id": target["lottery_id"],
+                "merchant_id": target["merchant_id"],
+                "name": lottery['name'],
+                "prizes": [{"id": str(uuid.uuid4()), "name": p['name'], "probability": p['probability']}
+                           for p in lottery.get('prizes') or []]
+            })
+        await _insert_chunked(database.insert_lotteries, lottery_rows)
+
+    if survey:
+        survey_rows = []
+        for target in targets:
+            target["survey_id"] = str(uuid.uuid4())
+            survey_rows.append({
+                "id": target["survey_id"],
+                "merchant_id": target["merchant_id"],
+                "name": survey['name'],
+                "lottery_id": target["lottery_id"] or survey.get('lottery_id'),
+                "created_at": created_at,
+                "questions": survey.get('questions') or []
+            })
+        await _insert_chunked(database.insert_surveys, survey_rows)
+
+    print(f"✅ Propagated templates to {len(targets)} stores of owner {owner_id} ({len(skipped)} skipped)")
+    return {"stores": targets, "skipped": skipped}
@@ -0,0 +1,154 @@
+"""
+Compact survey data for the AI prompt.
+
+Every response is read once (keyset pages, no row cap). Choice answers collapse into
+counts and percentages; free-text answers are deduplicated after normalization and
+listed with their frequency, most frequent first, until the token budget runs out.
+The remainder is summarized as a count instead of being cut off silently.
+"""
+import os
+import random
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List
+import database
+
+# Rough budget for the survey data part of the prompt (instructions come on top)
+AI_PROMPT_TOKEN_BUDGET = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "6000"))
+# Distinct texts tracked per question; rarer ones past this are only counted
+MAX_DISTINCT_TEXTS = 20000
+
+_PUNCT_RE = re.compile(r"[\s\.,!?;:，。！？；：、~\-_'\"“”‘’()（）]+")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for Latin text, ~1 per CJK character
+    wide = sum(1 for c in text if ord(c) > 0x2E80)
+    return int(wide + (len(text) - wide) / 4) + 1
+
+
+def normalize(text: str) -> str:
+    return _PUNCT_RE.sub(" ", text.lower()).strip()
+
+
+class TextTally:
+    """
+    Frequency of near-identical free-text answers (same text after normalization).
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.display = {}
+        self.total = 0
+        self.untracked = 0
+
+    def add(self, text: str):
+        self.total += 1
+        key = normalize(text)
+        if not key:
+            return
+        if key not in self.counts and len(self.counts) >= MAX_DISTINCT_TEXTS:
+            self.untracked += 1
+            return
+        self.counts[key] += 1
+        self.display.setdefault(key, text)
+
+    def render(self, budget: int, rng: random.Random) -> str:
+        """
+        Lists repeated answers by frequency, then a random sample of one-off answers,
+        while the token budget allows.
+        """
+        repeated = [(k, c) for k, c in self.counts.most_common() if c > 1]
+        singles = [k for k, c in self.counts.items() if c == 1]
+        rng.shuffle(singles)
+
+        lines = []
+        used = 0
+        shown = 0
+        for key, count in repeated + [(k, 1) for k in singles]:
+            line = f"- {self.display[key]}" + (f" (x{count})" if count > 1 else "")
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            lines.append(line)
+            used += cost
+            shown += count
+
+        hidden = self.total - shown
+        if hidden > 0:
+            lines.append(f"- ... {hidden} more answers not shown")
+        return "\n".join(lines)
+
+
+def _choice_summary(counts: Counter, options: List[str], answered: int) -> str:
+    parts = []
+    total = sum(counts.values())
+    for opt in options:
+        parts.append(f"{opt}: {counts[opt]} ({counts[opt] * 100 / total:.1f}%)" if total else f"{opt}: 0")
+    return f"Answered by {answered}. " + "; ".join(parts)
+
+
+async def build_survey_data(survey: dict, token_budget: int = AI_PROMPT_TOKEN_BUDGET) -> Dict[str, object]:
+    """
+    Returns {"total": n, "active": str, "unlinked": str} for the analysis prompt.
+    """
+    questions = survey.get('questions') or []
+    active = {q['id']: q for q in questions}
+
+    total = 0
+    answered = Counter()
+    choice_counts: Dict[str, Counter] = defaultdict(Counter)
+    texts: Dict[str, TextTally] = defaultdict(TextTally)  # free text, "other" and unlinked answers
+
+    async for batch in database.iter_response_answers(survey['id']):
+        for answers in batch:
+            total += 1
+            for q_id, val in answers.items():
+                val = str(val).strip() if val else ""
+                if not val:
+                    continue
+                answered[q_id] += 1
+                q = active.get(q_id)
+                if q is None or q.get('type') == 'text':
+                    texts[q_id].add(val)
+                    continue
+                options = q.get('options') or []
+                for sel in val.split(', '):
+                    if sel in options:
+                        choice_counts[q_id][sel] += 1
+                    elif sel:
+                        texts[q_id].add(sel)  # "Other" write-ins
+
+    # Choice summaries are small and always included; text lists share what is left
+    active_parts = []
+    for q_id, q in active.items():
+        if not answered[q_id]:
+            continue
+        if q.get('type') == 'text':
+            active_parts.append([q_id, f"Question: {q['text']} (free text, {answered[q_id]} answers)"])
+        else:
+            summary = _choice_summary(choice_counts[q_id], q.get('options') or [], answered[q_id])
+            header = f"Question: {q['text']} ({q.get('type', 'choice')})\nCounts: {summary}"
+            if q_id in texts:
+                header += f"\nOther (write-in) answers ({texts[q_id].total}):"
+            active_parts.append([q_id, header])
+
+    unlinked_parts = [[q_id, f"Old Question (ID: {q_id}, {answered[q_id]} answers):"]
+                      for q_id in texts if q_id not in active]
+
+    fixed_cost = sum(estimate_tokens(p[1]) for p in active_parts + unlinked_parts)
+    text_ids = [q_id for q_id in texts]
+    per_question = max(0, token_budget - fixed_cost) // max(1, len(text_ids))
+
+    # Seeded so the same data yields the same prompt
+    rng = random.Random(survey['id'])
+    for part in active_parts + unlinked_parts:
+        q_id = part[0]
+        if q_id in texts:
+            part[1] += "\n" + texts[q_id].render(per_question, rng)
+
+    return {
+        "total": total,
+        "active": "\n\n".join(p[1] for p in active_parts) if active_parts else "No active data.",
+        "unlinked": "\n\n".join(p[1] for p in unlinked_parts) if unlinked_parts else "No historical data."
+    }
@@ -0,0 +1,64 @@
+"""
+Runs a small graph of data fetches concurrently.
+
+Each stage names the stages it depends on and receives their results as positional
+arguments; stages without a path between them run at the same time, so an endpoint
+takes as long as its slowest chain instead of the sum of its queries.
+
+    plan = QueryPlan()
+    plan.add("survey_ids", database.get_all_survey_ids)
+    plan.add("total", database.count_responses_by_surveys, "survey_ids")
+    results = await plan.run()
+    response.headers["Server-Timing"] = plan.server_timing()
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class QueryPlan:
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, float] = {}  # stage -> own duration in ms (excluding waits)
+        self.total_ms = 0.0
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], *deps: str):
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (func, deps)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str):
+            func, deps = self._stages[name]
+            args = [await tasks[d] for d in deps]
+            t0 = time.perf_counter()
+            try:
+                return await func(*args)
+            finally:
+                self.timings[name] = (time.perf_counter() - t0) * 1000
+
+        # Stages are added after their dependencies, so creation order is a valid topological order
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        values = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.total_ms = (time.perf_counter() - started) * 1000
+
+        for value in values:
+            if isinstance(value, BaseException):
+                raise value
+        return dict(zip(tasks.keys(), values))
+
+    def server_timing(self) -> str:
+        """
+        Per-stage durations as a Server-Timing header value (visible in browser devtools).
+        """
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.timings.items()]
+        parts.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(parts)
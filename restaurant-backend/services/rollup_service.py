@@ -0,0 +1,91 @@
+"""
+Per-survey daily response counts.
+
+`submit_response` increments the bucket of each new response; the dashboard endpoints
+read buckets instead of scanning `responses.submitted_at`.
+
+Backfill / repair:
+    python -m services.rollup_service rebuild [--survey-id ID ...]
+"""
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import List, Optional
+import database
+
+
+def day_of(submitted_at: str) -> str:
+    return datetime.fromisoformat(submitted_at).date().isoformat()
+
+
+async def record_response(survey_id: str, submitted_at: str):
+    """
+    Adds one response to its daily bucket. A failure here must not fail the
+    submission itself; drift is repaired by `rebuild`.
+    """
+    try:
+        await database.increment_daily_count(survey_id, day_of(submitted_at))
+    except Exception as e:
+        print(f"⚠️ Rollup update failed for survey {survey_id}: {e}")
+
+
+async def record_responses(rows: List[dict]):
+    """
+    Batch variant of `record_response`: one increment per (survey, day) bucket.
+    """
+    buckets = Counter((r['survey_id'], day_of(r['submitted_at'])) for r in rows)
+    for (survey_id, day), delta in buckets.items():
+        try:
+            await database.increment_daily_count(survey_id, day, delta)
+        except Exception as e:
+            print(f"⚠️ Rollup update failed for survey {survey_id}: {e}")
+
+
+async def get_daily_totals(survey_ids: List[str], start_day: date, end_day: date):
+    """
+    Returns {date: count} summed over the given surveys, for days in [start_day, end_day].
+    """
+    totals = defaultdict(int)
+    for row in await database.get_daily_counts(survey_ids, start_day.isoformat(), end_day.isoformat()):
+        totals[date.fromisoformat(row['day'])] += row['count']
+    return totals
+
+
+async def rebuild(survey_ids: Optional[List[str]] = None):
+    """
+    Recomputes the rollup from the responses table (all surveys if none are given).
+    Run it once after applying the migration, or while writes are quiet.
+    """
+    # NumPy is only needed here; importing it lazily keeps it out of every worker's boot
+    from services import time_buckets
+
+    counts = Counter()
+    scanned = 0
+
+    async for batch in database.iter_response_days(survey_ids):
+        counts.update(time_buckets.survey_day_counts([r['survey_id'] for r in batch],
+                                                     [r['submitted_at'] for r in batch]))
+        scanned += len(batch)
+
+    rows = [{"survey_id": s_id, "day": day, "count": c} for (s_id, day), c in counts.items()]
+    target_ids = survey_ids if survey_ids else await database.get_all_survey_ids()
+    await database.replace_daily_counts(target_ids, rows)
+
+    print(f"✅ Rollup rebuilt: {scanned} responses -> {len(rows)} daily buckets")
+    return {"responses": scanned, "buckets": len(rows)}
+
+
+async def _main(args):
+    await database.init_client()
+    if args.command == "rebuild":
+        await rebuild(args.survey_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daily response rollup maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_cmd = sub.add_parser("rebuild", help="Backfill / rebuild the daily rollup")
+    rebuild_cmd.add_argument("--survey-id", action="append", dest="survey_ids",
+                             help="Only rebuild these surveys (repeatable)")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,96 @@
+"""
+Customer survey submission: store the response, draw the lottery, return the result.
+
+Submissions are idempotent on the response id, which the client generates once per
+submission and resends on retries (body `id` or an `Idempotency-Key` header):
+
+- a bounded per-worker cache maps recent ids to their lottery result, and concurrent
+  attempts with the same id on one worker wait for the first one;
+- behind it the responses primary key is the uniqueness check: an insert that hits an
+  existing id writes nothing and the stored `lottery_result` is returned instead of a
+  second draw (covers retries that land on another worker).
+
+In journal ingest mode the duplicate row is dropped when the batch is flushed; a retry
+on another worker before that flush still gets a fresh draw.
+"""
+import asyncio
+import os
+from typing import Dict, Optional
+from fastapi import BackgroundTasks, HTTPException
+import database
+from cache import TTLCache
+from services import ingest_service, lottery_service, rollup_service
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "50000"))
+
+result_cache = TTLCache("submission_results", IDEMPOTENCY_TTL, IDEMPOTENCY_CACHE_SIZE)
+_inflight: Dict[tuple, asyncio.Event] = {}
+
+
+async def draw(survey_id: str) -> dict:
+    # Survey -> lottery link and the compiled lottery are cached, so a warm
+    # submission needs no further round trip before the draw
+    lottery_id = await lottery_service.get_survey_lottery_id(survey_id)
+    if lottery_id:
+        won_prize = await lottery_service.run_lottery_algorithm(lottery_id)
+        if won_prize:
+            return {"won": True, "prize": won_prize, "message": f"恭喜！你获得了 {won_prize['name']}"}
+        else:
+            return {"won": False, "prize": None, "message": "很遗憾，这次没有中奖。"}
+    return {"won": False, "prize": None, "message": "感谢您的反馈！"}
+
+
+async def _store(row: dict, background_tasks: BackgroundTasks) -> dict:
+    result = await draw(row['survey_id'])
+    row = {**row, "lottery_result": result}
+
+    if ingest_service.enabled():
+        # Journaled locally, bulk-inserted (and rolled up) by the background flusher
+        await ingest_service.submit(row)
+        return result
+
+    if await database.insert_responses([row]):
+        # Rollup bump runs after the response is sent, off the customer's critical path
+        background_tasks.add_task(rollup_service.record_response, row["survey_id"], row["submitted_at"])
+        return result
+
+    # The id already exists: an earlier attempt of this submission was stored
+    existing = await database.get_response_by_id(row['id'])
+    if existing and existing['survey_id'] != row['survey_id']:
+        raise HTTPException(status_code=409, detail="Idempotency key already used for another survey")
+    return (existing or {}).get('lottery_result') or result
+
+
+def known_result(survey_id: str, response_id: str) -> Optional[dict]:
+    """
+    The cached result of a submission this worker already stored, if any.
+    """
+    return result_cache.get((survey_id, response_id))
+
+
+async def submit(row: dict, background_tasks: BackgroundTasks) -> dict:
+    """
+    Stores `row` (id, survey_id, customer_id, answers, submitted_at) and returns its
+    lottery result; a repeated id returns the original result without writing again.
+    """
+    # Keyed by survey too, so an id reused for another survey reaches the datastore check
+    key = (row['survey_id'], row['id'])
+    while True:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+        pending = _inflight.get(key)
+        if pending is None:
+            break
+        # Same submission already in progress on this worker
+        await pending.wait()
+
+    event = _inflight[key] = asyncio.Event()
+    try:
+        result = await _store(row, background_tasks)
+        result_cache.set(key, result)
+        return result
+    finally:
+        del _inflight[key]
+        event.set()
@@ -0,0 +1,111 @@
+"""
+Signed session tokens.
+
+`login` issues a token carrying the merchant's id, username, role and owner id, signed
+with HMAC-SHA256 (SESSION_SECRET). Routers take `current_merchant` as a dependency: a
+valid token is verified locally, with no merchant lookup. Clients that send no token
+(or one this worker cannot verify), and requests about another merchant than the
+token's, still work through the `merchant_id` query parameter, resolved from the
+merchant cache as before.
+
+Token: base64url(JSON claims) "." base64url(signature).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import Depends, Header, HTTPException, Query
+import database
+
+load_dotenv()
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(12 * 3600)))
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+
+if not SESSION_SECRET:
+    print("Warning: SESSION_SECRET not set; session tokens are only valid in this worker process.")
+    SESSION_SECRET = secrets.token_hex(32)
+
+_KEY = SESSION_SECRET.encode("utf-8")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_KEY, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(merchant: dict) -> Tuple[str, int]:
+    """
+    Returns (token, expiry as a unix timestamp) for a logged-in merchant.
+    """
+    expires_at = int(time.time()) + SESSION_TTL_SECONDS
+    claims = {
+        "sub": str(merchant['id']),
+        "usr": merchant.get('username'),
+        "role": merchant.get('role'),
+        "own": str(merchant['owner_id']) if merchant.get('owner_id') else None,
+        "exp": expires_at
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """
+    Returns the merchant fields of a valid, unexpired token (id, username, role,
+    owner_id, shaped like a merchant row), or None.
+    """
+    try:
+        payload, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, UnicodeError):
+        return None
+
+    if not isinstance(claims, dict) or claims.get("exp", 0) < time.time():
+        return None
+    return {"id": claims["sub"], "username": claims.get("usr"), "role": claims.get("role"),
+            "owner_id": claims.get("own")}
+
+
+async def viewed_merchant(merchant_id: Optional[str] = Query(None, description="Merchant to act as / view"),
+                          authorization: Optional[str] = Header(None)) -> Optional[dict]:
+    """
+    Dependency: the merchant a request is about. The bearer token is used when
+    `merchant_id` is absent or names the token's own merchant; any other `merchant_id`
+    (an owner previewing a store's customer page, say) is looked up as before.
+    None when `merchant_id` names no merchant.
+    """
+    if authorization and authorization.lower().startswith("bearer "):
+        merchant = verify_token(authorization[7:].strip())
+        if merchant and (not merchant_id or merchant_id == merchant['id']):
+            return merchant
+        if not merchant_id:
+            raise HTTPException(status_code=401, detail="Invalid or expired session token")
+
+    if not merchant_id:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    return await database.get_merchant_by_id(merchant_id)
+
+
+async def current_merchant(merchant: Optional[dict] = Depends(viewed_merchant)) -> dict:
+    """
+    Like `viewed_merchant`, but an unknown merchant is a 404.
+    """
+    if not merchant:
+        raise HTTPException(status_code=404, detail="Merchant not found")
+    return merchant
@@ -0,0 +1,27 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from repositories.sqlite_repo import SQLiteRepository  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """
+    `database` backed by a fresh in-memory SQLite repository, with empty caches.
+    """
+    database.repo = SQLiteRepository(":memory:")
+    database.merchant_cache.clear()
+    database.merchant_subs_cache.clear()
+    yield database
+    asyncio.run(database.close_client())
+
+
+@pytest.fixture
+def run():
+    return asyncio.run
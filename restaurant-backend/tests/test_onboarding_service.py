@@ -0,0 +1,43 @@
+import uuid
+
+from services import onboarding_service
+
+
+def _merchant(db, run, role, owner_id=None):
+    merchant = {"id": str(uuid.uuid4()), "restaurant_name": role, "username": str(uuid.uuid4()),
+                "password": "p", "role": role, "owner_id": owner_id}
+    run(db.register_merchant(merchant))
+    return merchant['id']
+
+
+def _chain(db, run):
+    owner = _merchant(db, run, "owner")
+    stores = [_merchant(db, run, "manager", owner) for _ in range(3)]
+    survey_id, lottery_id = str(uuid.uuid4()), str(uuid.uuid4())
+    run(db.insert_lottery({"id": lottery_id, "merchant_id": stores[0], "name": "Draw",
+                           "prizes": [{"id": str(uuid.uuid4()), "name": "Cake", "probability": 0.1}]}))
+    run(db.insert_survey({"id": survey_id, "merchant_id": stores[0], "name": "Visit", "lottery_id": lottery_id,
+                          "created_at": "2026-01-01T00:00:00", "questions": []}))
+    return owner, stores, survey_id, lottery_id
+
+
+def test_store_template_propagates_to_the_owners_other_stores(db, run):
+    owner, stores, survey_id, lottery_id = _chain(db, run)
+
+    result = run(onboarding_service.propagate_templates(survey_id, lottery_id))
+
+    assert sorted(s['merchant_id'] for s in result['stores']) == sorted(stores[1:])
+    for store in stores[1:]:
+        surveys = run(db.get_surveys_by_merchant(store))
+        assert [s['name'] for s in surveys] == ["Visit"]
+        assert surveys[0]['lottery_id'] != lottery_id
+
+
+def test_template_store_gets_no_copy(db, run):
+    owner, stores, survey_id, lottery_id = _chain(db, run)
+
+    result = run(onboarding_service.propagate_templates(survey_id, None, owner_id=owner, store_ids=stores))
+
+    assert sorted(s['merchant_id'] for s in result['stores']) == sorted(stores[1:])
+    assert result['skipped'] == [stores[0]]
+    assert [s['id'] for s in run(db.get_surveys_by_merchant(stores[0]))] == [survey_id]
@@ -109,6 +109,7 @@ const AppContent: React.FC = () => {
                     );
                 }
                 return <MerchantDashboard merchant={loggedInMerchant} onLogout={() => {
+                    db.logoutMerchant();
                     setLoggedInMerchant(null);
                     setCurrentView(ViewState.MERCHANT_LOGIN);
                 }} />;
@@ -1,7 +1,7 @@
 
 import React, { useState } from 'react';
 import { useLanguage } from '../../../contexts/LanguageContext';
-import type { Survey, SurveyResponse, UUID, Merchant } from '../../../types';
+import type { Survey, SurveySummary, UUID, Merchant } from '../../../types';
 import { PieChart, Pie, Cell, ResponsiveContainer, Tooltip } from 'recharts';
 import { db } from '../../../services/api';
 import { Sparkles, Loader2, Bot, Archive, AlertCircle, HelpCircle, Merge } from 'lucide-react';
@@ -20,23 +20,22 @@ const COLORS = ['#4F46E5', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899'
 export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, isOwner, ownedRestaurants, getMerchantName }) => {
     const { t, language } = useLanguage();
     const [selectedSurveyId, setSelectedSurveyId] = useState<UUID | ''>('');
-    const [responses, setResponses] = useState<SurveyResponse[]>([]);
+    const [summary, setSummary] = useState<SurveySummary | null>(null);
 
     // AI State
     const [isAnalyzing, setIsAnalyzing] = useState(false);
     const [aiResult, setAiResult] = useState<string | null>(null);
 
     const selectedSurvey = surveys.find(s => s.id === selectedSurveyId);
-
-    // Create a Set of active IDs for fast lookup
-    const activeQuestionIds = new Set(selectedSurvey ? selectedSurvey.questions.map(q => q.id) : []);
+    const totalResponses = summary?.total_responses ?? 0;
 
     const handleLoadAnalytics = async () => {
         if (!selectedSurveyId) return;
         setAiResult(null);
         try {
-            const res = await db.getResponses(selectedSurveyId);
-            setResponses(res);
+            // Counting (incl. smart merge of old question ids) happens on the server
+            const res = await db.getSurveySummary(selectedSurveyId);
+            setSummary(res);
         } catch (e) {
             alert(t.common.error);
         }
@@ -61,43 +60,7 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
         }
     };
 
-    // Check if an orphan value was merged into ANY chart
-    // If it matches options of ANY current choice question, we consider it "Merged" and hide it from the bottom list
-    const isValueMerged = (val: string) => {
-        if (!selectedSurvey) return false;
-        for (const q of selectedSurvey.questions) {
-            if (q.type === 'text') continue;
-            if (q.options?.includes(val)) return true;
-            if (q.type === 'multi') {
-                const parts = val.split(', ');
-                // If at least one part is recognized, we treat it as partially merged
-                if (parts.some(p => q.options.includes(p))) return true;
-            }
-        }
-        return false;
-    };
-
-    // Recover orphaned data that was NOT merged
-    const getUnlinkedData = () => {
-        if (!selectedSurvey || responses.length === 0) return [];
-
-        const allResponseKeys = new Set<string>();
-        responses.forEach(r => {
-            if (r.answers) Object.keys(r.answers).forEach(k => allResponseKeys.add(k));
-        });
-
-        const deletedIds = Array.from(allResponseKeys).filter(id => !activeQuestionIds.has(id));
-
-        return deletedIds.map(id => {
-            const answers = responses
-                .map(r => r.answers?.[id])
-                .filter(ans => ans !== undefined && ans !== null && ans !== '')
-                .filter(ans => !isValueMerged(ans)); // HIDE if it was merged to chart
-            return { id, answers };
-        }).filter(item => item.answers.length > 0);
-    };
-
-    const unlinkedData = getUnlinkedData();
+    const unlinkedData = summary?.unlinked ?? [];
 
     // Group surveys by merchant for Owner view
     const renderSurveyOptions = () => {
@@ -126,7 +89,7 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
             <h2 className="text-2xl font-bold mb-4">{t.dashboard.tabAnalytics}</h2>
             <div className="flex flex-wrap gap-4 mb-6 items-end">
                 <div className="flex-1 min-w-[200px]">
-                    <select className="border p-2.5 rounded w-full bg-white shadow-sm" value={selectedSurveyId} onChange={e => { setSelectedSurveyId(e.target.value); setAiResult(null); }}>
+                    <select className="border p-2.5 rounded w-full bg-white shadow-sm" value={selectedSurveyId} onChange={e => { setSelectedSurveyId(e.target.value); setSummary(null); setAiResult(null); }}>
                         <option value="">{t.dashboard.selectSurvey}</option>
                         {renderSurveyOptions()}
                     </select>
@@ -139,7 +102,7 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
                     {t.dashboard.loadReport}
                 </button>
 
-                {responses.length > 0 && (
+                {totalResponses > 0 && (
                     <button
                         onClick={handleAiAnalyze}
                         disabled={isAnalyzing || !selectedSurveyId}
@@ -186,10 +149,10 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
                 </div>
             )}
 
-            {responses.length > 0 && selectedSurvey ? (
+            {summary && totalResponses > 0 && selectedSurvey ? (
                 <div className="space-y-6">
                     <div className="bg-blue-50 p-4 rounded text-blue-900 flex justify-between items-center border border-blue-100">
-                        <span>{t.dashboard.totalResponses}: <strong>{responses.length}</strong></span>
+                        <span>{t.dashboard.totalResponses}: <strong>{totalResponses}</strong></span>
                         <div className="flex items-center gap-1 text-xs bg-white px-2 py-1 rounded border border-blue-200 text-blue-600">
                             <Merge size={14} />
                             <span>{t.dashboard.smartMergeActive}</span>
@@ -197,12 +160,12 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
                     </div>
 
                     {/* Active Questions Loop */}
-                    {selectedSurvey.questions.map(q => {
+                    {summary.questions.map(q => {
                         // Analytics for Text type questions
                         if (q.type === 'text') {
-                            const textAnswers = responses.map(r => r.answers?.[q.id]).filter(Boolean);
+                            const textAnswers = q.text_samples;
                             return (
-                                <div key={q.id} className="bg-white p-4 rounded border shadow-sm">
+                                <div key={q.question_id} className="bg-white p-4 rounded border shadow-sm">
                                     <h4 className="font-bold mb-4 flex items-center gap-2"><div className="w-1 h-6 bg-indigo-500 rounded"></div> {q.text}</h4>
                                     <div className="max-h-64 overflow-y-auto space-y-2 bg-gray-50 p-2 rounded border border-gray-100">
                                         {textAnswers.length > 0 ? textAnswers.map((txt, i) => (
@@ -213,63 +176,17 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
                             )
                         }
 
-                        // Analytics for Choice type questions (Smart Merge Implemented)
-                        const allSelections: string[] = [];
-                        let mergedCount = 0;
-
-                        responses.forEach(r => {
-                            // 1. Direct ID Match
-                            const ans = r.answers?.[q.id];
-                            if (ans && typeof ans === 'string') {
-                                const split = ans.split(', ');
-                                allSelections.push(...split);
-                            }
-
-                            // 2. Smart Merge (Orphan Recovery)
-                            // Look for answers with OTHER keys (orphaned IDs)
-                            Object.keys(r.answers || {}).forEach(key => {
-                                if (key === q.id) return; // Already handled
-                                if (activeQuestionIds.has(key)) return; // Belongs to another active question, don't steal it
-
-                                const val = r.answers[key];
-                                if (!val) return;
-
-                                // If the orphan value matches an option in THIS question, count it!
-                                if (q.type === 'multi') {
-                                    const parts = val.split(', ');
-                                    // Filter parts that match valid options for this question
-                                    const matches = parts.filter(p => q.options.includes(p));
-                                    if (matches.length > 0) {
-                                        allSelections.push(...matches);
-                                        mergedCount++;
-                                    }
-                                } else {
-                                    // Single choice match
-                                    if (q.options.includes(val)) {
-                                        allSelections.push(val);
-                                        mergedCount++;
-                                    }
-                                }
-                            });
-                        });
-
-                        const data = q.options.map(opt => ({
-                            name: opt,
-                            value: allSelections.filter(sel => sel === opt).length
-                        }));
-
-                        let otherResponses: string[] = [];
-                        if (q.allow_other) {
-                            otherResponses = allSelections.filter(sel => sel && !q.options.includes(sel));
-                            if (otherResponses.length > 0) {
-                                data.push({ name: 'Other', value: otherResponses.length });
-                            }
+                        // Analytics for Choice type questions (Smart Merge done server-side)
+                        const data = [...q.options];
+                        if (q.other_count > 0) {
+                            data.push({ name: 'Other', value: q.other_count });
                         }
 
-                        const totalVotes = data.reduce((acc, curr) => acc + curr.value, 0);
+                        const mergedCount = q.merged_count;
+                        const totalVotes = q.total_votes;
 
                         return (
-                            <div key={q.id} className="bg-white p-6 rounded-xl border border-gray-100 shadow-sm hover:shadow-md transition-shadow">
+                            <div key={q.question_id} className="bg-white p-6 rounded-xl border border-gray-100 shadow-sm hover:shadow-md transition-shadow">
                                 <div className="flex justify-between items-start mb-1">
                                     <h4 className="font-bold flex items-center gap-2">
                                         <div className={`w-1 h-6 ${q.type === 'multi' ? 'bg-purple-500' : 'bg-indigo-500'} rounded`}></div>
@@ -336,13 +253,13 @@ export const AnalyticsTab: React.FC<AnalyticsTabProps> = ({ surveys, isAdmin, is
 
                             <div className="grid gap-4 md:grid-cols-2">
                                 {unlinkedData.map((item) => (
-                                    <div key={item.id} className="bg-gray-100 p-4 rounded border border-gray-300 relative group">
-                                        <div className="absolute top-2 right-2 text-gray-400 group-hover:text-gray-600 cursor-help" title={`Original Question ID: ${item.id}`}>
+                                    <div key={item.question_id} className="bg-gray-100 p-4 rounded border border-gray-300 relative group">
+                                        <div className="absolute top-2 right-2 text-gray-400 group-hover:text-gray-600 cursor-help" title={`Original Question ID: ${item.question_id}`}>
                                             <HelpCircle size={16} />
                                         </div>
                                         <h4 className="font-bold text-gray-500 mb-3 text-sm uppercase tracking-wide">{t.dashboard.orphanedResponses}</h4>
                                         <div className="max-h-48 overflow-y-auto space-y-2 bg-white p-2 rounded border border-gray-200">
-                                            {item.answers.map((ans, i) => (
+                                            {item.samples.map((ans, i) => (
                                                 <div key={i} className="p-2 border-b border-gray-100 last:border-0 text-sm text-gray-700">
                                                     {String(ans)}
                                                 </div>
@@ -42,32 +42,20 @@ export const HomeTab: React.FC<HomeTabProps> = ({ merchant, isAdmin, isOwner, ow
     // Generate Year Options (Last 5 years)
     const yearOptions = Array.from({length: 5}, (_, i) => new Date().getFullYear() - i);
 
-    // Initial Stats Load & On Filter Change
+    // Stats + Trend Load (one request; dependent on Filters & Date)
     useEffect(() => {
-        const loadStats = async () => {
+        const loadDashboard = async () => {
             try {
-                const s = await db.getDashboardStats(merchant.id, filterStoreId);
-                setStats(s);
-            } catch (e) {
-                console.error(e);
-            }
-        };
-        loadStats();
-    }, [merchant.id, filterStoreId]);
-
-    // Trend Load (Dependent on Filters & Date)
-    useEffect(() => {
-        const loadTrends = async () => {
-            try {
-                const tr = await db.getDashboardTrends(merchant.id, viewMode, filterStoreId, selectedDate);
-                setTrends(tr);
+                const d = await db.getDashboard(merchant.id, [`${viewMode}:${selectedDate}`], filterStoreId);
+                setStats(d.stats);
+                setTrends(d.periods[0] || null);
             } catch (e) {
                 console.error(e);
             } finally {
                 setLoading(false);
             }
         };
-        loadTrends();
+        loadDashboard();
     }, [merchant.id, viewMode, filterStoreId, selectedDate]);
 
     const renderTrend = (val: number) => {
@@ -1,5 +1,5 @@
 
-import type { Lottery, Survey, SurveyResponse, UUID, LotteryResult, Merchant, DashboardStats, DashboardTrends } from '../types';
+import type { Lottery, Survey, SurveyResponse, UUID, LotteryResult, Merchant, LoginResult, DashboardStats, DashboardTrends, Dashboard, SurveySummary, BackgroundJob, AnalysisResult } from '../types';
 
 // 获取环境变量中的 API 地址
 let envApiUrl = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8001/api';
@@ -16,17 +16,31 @@ const API_BASE_URL = envApiUrl;
 
 console.log("🔌 API Connected to:", API_BASE_URL);
 
+// Session token from the last login; lets the backend resolve the merchant without a lookup
+let sessionToken: string | null = null;
+
 /**
  * Enhanced Fetch with Retry Logic
  * Handles Render/Supabase cold starts by retrying 5xx errors automatically.
  */
 async function fetchWithRetry(url: string, options: RequestInit = {}, retries = 3, backoff = 1000): Promise<Response> {
+    let wait = backoff;
     try {
-        const response = await fetch(url, options);
+        const headers = new Headers(options.headers);
+        if (sessionToken && !headers.has('Authorization')) {
+            headers.set('Authorization', `Bearer ${sessionToken}`);
+        }
+        const response = await fetch(url, { ...options, headers });
 
         // If successful, return immediately
         if (response.ok) return response;
 
+        // Shed by the server's admission control (429 / 503): retry, waiting at least as long as it asks
+        if ((response.status === 429 || response.status === 503) && retries > 0) {
+            wait = Math.max(backoff, Number(response.headers.get('Retry-After') || 0) * 1000);
+            throw new Error(`Server Busy: ${response.status}`);
+        }
+
         // If it's a client error (4xx), don't retry (e.g., Wrong Password)
         if (response.status < 500) return response;
 
@@ -34,8 +48,8 @@ async function fetchWithRetry(url: string, options: RequestInit = {}, retries =
         throw new Error(`Server Error: ${response.status}`);
     } catch (err) {
         if (retries > 0) {
-            console.warn(`Request failed, retrying in ${backoff}ms... (${retries} attempts left)`);
-            await new Promise(resolve => setTimeout(resolve, backoff));
+            console.warn(`Request failed, retrying in ${wait}ms... (${retries} attempts left)`);
+            await new Promise(resolve => setTimeout(resolve, wait));
             // Exponential backoff: 1s -> 2s -> 4s
             return fetchWithRetry(url, options, retries - 1, backoff * 2);
         }
@@ -65,7 +79,13 @@ export const db = {
             body: JSON.stringify({ username, password })
         });
         if (!response.ok) throw new Error('Login failed');
-        return await response.json();
+        const result: LoginResult = await response.json();
+        sessionToken = result.token;
+        return result;
+    },
+
+    logoutMerchant: () => {
+        sessionToken = null;
     },
 
     getMerchants: async (ownerId?: UUID): Promise<Merchant[]> => {
@@ -167,26 +187,56 @@ export const db = {
     },
 
     saveResponse: async (response: SurveyResponse): Promise<LotteryResult> => {
+        // Retries resend the same id, so the backend stores the response and draws the lottery once
         const res = await fetchWithRetry(`${API_BASE_URL}/responses/`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': response.id },
             body: JSON.stringify(response),
         });
         if (!res.ok) throw new Error('Failed to submit response');
         return await res.json();
     },
 
+    getSurveySummary: async (surveyId: UUID): Promise<SurveySummary> => {
+        const response = await fetchWithRetry(`${API_BASE_URL}/analytics/survey-summary?survey_id=${surveyId}`);
+        if (!response.ok) throw new Error('Failed to load survey summary');
+        return await response.json();
+    },
+
     // --- AI Analytics ---
     analyzeSurvey: async (surveyId: UUID, language: string = 'en'): Promise<string> => {
-        const response = await fetchWithRetry(`${API_BASE_URL}/analytics/analyze?survey_id=${surveyId}&language=${language}`, {
+        // Submitted as a background job, then polled (LLM calls can outlast the request timeout)
+        const response = await fetchWithRetry(`${API_BASE_URL}/analytics/analyze/jobs?survey_id=${surveyId}&language=${language}`, {
             method: 'POST'
         });
         if (!response.ok) throw new Error('Analysis failed');
-        const data = await response.json();
-        return data.analysis;
+        let job: BackgroundJob<AnalysisResult> = await response.json();
+
+        const deadline = Date.now() + 5 * 60 * 1000;
+        while (job.status === 'queued' || job.status === 'running') {
+            if (Date.now() > deadline) throw new Error('Analysis timed out');
+            await new Promise(resolve => setTimeout(resolve, 2000));
+            const poll = await fetchWithRetry(`${API_BASE_URL}/analytics/analyze/jobs/${job.id}`);
+            if (!poll.ok) throw new Error('Analysis failed');
+            job = await poll.json();
+        }
+
+        if (job.status === 'failed' || !job.result) throw new Error(job.error || 'Analysis failed');
+        return job.result.analysis;
     },
 
     // --- Dashboard Analytics ---
+    // Overview + one trend period per entry of `periods` ('month:YYYY-MM' / 'year:YYYY') in one request
+    getDashboard: async (merchantId: UUID, periods: string[], filterStoreId?: string): Promise<Dashboard> => {
+        let url = `${API_BASE_URL}/analytics/dashboard?merchant_id=${merchantId}`;
+        if (filterStoreId) url += `&filter_merchant_id=${filterStoreId}`;
+        periods.forEach(p => { url += `&periods=${encodeURIComponent(p)}`; });
+
+        const response = await fetchWithRetry(url);
+        if (!response.ok) throw new Error("Failed to load dashboard");
+        return await response.json();
+    },
+
     getDashboardStats: async (merchantId: UUID, filterStoreId?: string): Promise<DashboardStats> => {
         let url = `${API_BASE_URL}/analytics/dashboard-stats?merchant_id=${merchantId}`;
         if (filterStoreId) url += `&filter_merchant_id=${filterStoreId}`;
@@ -10,6 +10,11 @@ export interface Merchant {
     password?: string; // Only used for displaying in Owner view
 }
 
+export interface LoginResult extends Merchant {
+    token: string; // Signed session token, sent as `Authorization: Bearer <token>`
+    token_expires_at: number; // Unix timestamp
+}
+
 export interface Prize {
     id: UUID;
     name: string;
@@ -92,6 +97,66 @@ export interface DashboardTrends {
     chart_data: ChartPoint[];
 }
 
+export interface DashboardPeriod extends DashboardTrends {
+    view_mode: 'month' | 'year';
+    target_date?: string;
+}
+
+export interface Dashboard {
+    stats: DashboardStats;
+    periods: DashboardPeriod[];
+}
+
+// --- Survey Summary Types ---
+
+export interface OptionCount {
+    name: string;
+    value: number;
+}
+
+export interface QuestionSummary {
+    question_id: UUID;
+    text: string;
+    type: 'choice' | 'multi' | 'text';
+    options: OptionCount[];
+    other_count: number;
+    other_samples: string[];
+    merged_count: number;
+    total_votes: number;
+    text_count: number;
+    text_samples: string[];
+}
+
+export interface UnlinkedSummary {
+    question_id: string;
+    count: number;
+    samples: string[];
+}
+
+export interface SurveySummary {
+    survey_id: UUID;
+    total_responses: number;
+    questions: QuestionSummary[];
+    unlinked: UnlinkedSummary[];
+}
+
+// --- Background Jobs ---
+
+export interface BackgroundJob<T> {
+    id: string;
+    kind: string;
+    status: 'queued' | 'running' | 'done' | 'failed';
+    result: T | null;
+    error: string | null;
+}
+
+export interface AnalysisResult {
+    analysis: string;
+    cached: boolean;
+    response_count: number;
+    generated_at: string | null;
+}
+
 export const ViewState = {
     HOME: 'HOME',
     CUSTOMER_MERCHANT_LIST: 'CUSTOMER_MERCHANT_LIST',